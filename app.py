@@ -1,10 +1,35 @@
 import streamlit as st
 import pandas as pd
-import joblib
 import os
-from datetime import datetime, timedelta
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
 import altair as alt
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from dashboard_summary import read_summary, source_stamp, summarize, summary_frame
+from estimators import DEFAULT_ENGINE, engine_label
+from feature_state import period, periods_per_day
+from forecast_cache import ForecastCache, forecast_key
+from forecasting import (
+    DEFAULT_QUANTILES,
+    make_predictor,
+    make_tree_sampler,
+    quantile_column,
+    steps_until,
+)
+from instrumentation import COUNTERS, stage
+from model_store import (
+    GLOBAL_MODEL,
+    ModelCache,
+    artifact_name,
+    model_exists,
+    read_metadata,
+)
+from states import REGIONS, region_of
+from storage import get_storage
+
 # =========================================================
 # PAGE CONFIG
 # =========================================================
@@ -55,19 +80,23 @@ st.markdown(
 # =========================================================
 # PATHS
 # =========================================================
-FEATURE_DIR = "data/processed_features"
 MODEL_DIR = "models"
 
+# Upper bound on state models kept in memory across sessions
+MAX_LOADED_MODELS = int(os.environ.get("MAX_LOADED_MODELS", 8))
+
+# Optional directory shared by app workers for cached forecast trajectories
+FORECAST_CACHE_DIR = os.environ.get("FORECAST_CACHE_DIR")
+
+# Parquet dataset under data/parquet/ when present, CSV files otherwise
+STORAGE = get_storage().name
+
+# Threads forecasting states concurrently in the comparison view
+COMPARE_WORKERS = int(os.environ.get("COMPARE_WORKERS", min(8, 2 * (os.cpu_count() or 1))))
+
 # =========================================================
 # DEPLOYMENT SAFETY CHECKS
 # =========================================================
-if not os.path.exists(FEATURE_DIR):
-    st.error(
-        "Processed feature files are not available in this deployment.\n\n"
-        "Please ensure `data/processed_features/` is included in the repository."
-    )
-    st.stop()
-
 if not os.path.exists(MODEL_DIR):
     st.error(
         "Trained models directory not found.\n\n"
@@ -79,78 +108,243 @@ if not os.path.exists(MODEL_DIR):
 # LOAD STATES (PURE DATA FUNCTION)
 # =========================================================
 @st.cache_data
-def get_states(feature_dir):
-    return sorted(
-        f.replace("_features.csv", "")
-        for f in os.listdir(feature_dir)
-        if f.endswith("_features.csv")
-    )
+def get_states(storage_name):
+    return get_storage(storage_name).list_states("features")
 
-states = get_states(FEATURE_DIR)
+states = get_states(STORAGE)
 
 if not states:
-    st.error("No state feature files found.")
+    st.error(
+        "Processed feature files are not available in this deployment.\n\n"
+        "Please ensure `data/processed_features/` is included in the repository."
+    )
     st.stop()
 
-states = ["Select State"] + states
+# =========================================================
+# CACHED DATA AND MODELS
+# =========================================================
+@st.cache_data(show_spinner=False)
+def load_state_summary(state, storage_name, stamp):
+    # Precomputed by the pipeline (a few KB); summarized here once per
+    # data version only when missing or out of date
+    storage = get_storage(storage_name)
+    summary = read_summary(storage, state, stamp=stamp)
+    if summary is None:
+        summary = summarize(storage.read_state("features", state), stamp)
+    return summary
+
+def state_summary(state):
+    return load_state_summary(state, STORAGE, source_stamp(get_storage(STORAGE), state))
+
+@st.cache_resource
+def get_model_cache():
+    # One LRU cache per server process; least recently used states are
+    # evicted once MAX_LOADED_MODELS are resident
+    return ModelCache(max_models=MAX_LOADED_MODELS, model_dir=MODEL_DIR)
+
+@st.cache_resource
+def get_forecast_cache():
+    return ForecastCache(disk_dir=FORECAST_CACHE_DIR)
+
+def forecast_day(state, summary, day, model_cache, forecast_cache):
+    """Mean forecast load of ``day`` for one state; safe to run in threads."""
+    freq = summary["freq"]
+    last_date = pd.Timestamp(summary["last_date"])
+    steps = steps_until(last_date, day + pd.Timedelta(days=1) - period(freq), freq)
+
+    with stage("app.compare", log=False, state=state):
+        model, fingerprint = model_cache.get(state)
+        key = forecast_key(state, last_date, fingerprint)
+        forecast_df = forecast_cache.forecast(
+            key,
+            model,
+            summary_frame(summary, "tail"),
+            steps,
+            predictor=make_predictor(model),
+            freq=freq
+        )
+
+    day_rows = forecast_df["date"].dt.normalize() == day
+    return {
+        "State": state,
+        "Region": region_of(state),
+        "Last Load": summary["last_load"],
+        "Predicted": forecast_df.loc[day_rows, "prediction"].mean(),
+    }
+
+# =========================================================
+# VIEW SELECTION
+# =========================================================
+view = st.radio("View", ["Single state", "Compare states"], horizontal=True)
+
+# =========================================================
+# MULTI-STATE COMPARISON
+# =========================================================
+if view == "Compare states":
+    st.subheader("🗺️ Compare States")
+
+    available = [state for state in states if model_exists(state, MODEL_DIR)]
+    default_states = [state for state in REGIONS["Eastern"] if state in available]
+    # Tables outside the regional grids (e.g. the single-state "clean"
+    # output) would be counted twice in the totals
+    regional = [state for state in available if region_of(state) != "Other"]
+    if st.checkbox(f"All states ({len(regional)})"):
+        compare_states = regional
+    else:
+        compare_states = st.multiselect(
+            "States", available, default=default_states or available[:5]
+        )
+
+    compare_date = st.date_input(
+        "Prediction Date (DD/MM/YYYY)",
+        value=datetime.today().date(),
+        format="DD/MM/YYYY",
+        key="compare_date"
+    )
+
+    if st.button("🔮 Forecast Selected States") and compare_states:
+        day = pd.to_datetime(compare_date)
+
+        # Summaries are a few KB each, read here; models load and forecast
+        # in the worker threads
+        summaries = {state: state_summary(state) for state in compare_states}
+        too_old = [
+            state for state, summary in summaries.items()
+            if pd.Timestamp(summary["last_date"]).normalize() >= day
+        ]
+        if too_old:
+            st.warning(
+                "Skipping states with data on or after the selected date: "
+                + ", ".join(too_old)
+            )
+        pending = [state for state in compare_states if state not in too_old]
+
+        progress = st.progress(0.0, text="Forecasting...")
+        chart_slot = st.empty()
+        results = []
+
+        model_cache, forecast_cache = get_model_cache(), get_forecast_cache()
+        with ThreadPoolExecutor(max_workers=COMPARE_WORKERS) as executor:
+            futures = {
+                executor.submit(
+                    forecast_day, state, summaries[state], day, model_cache, forecast_cache
+                ): state
+                for state in pending
+            }
+            # Each state joins the chart as soon as its forecast finishes
+            for future in as_completed(futures):
+                results.append(future.result())
+                progress.progress(
+                    len(results) / len(pending),
+                    text=f"Forecast {len(results)} of {len(pending)} states"
+                )
+                chart_slot.altair_chart(
+                    alt.Chart(pd.DataFrame(results))
+                    .mark_bar()
+                    .encode(
+                        x=alt.X("Predicted:Q", title="Predicted Load (GWh)"),
+                        y=alt.Y("State:N", sort="-x", title=None),
+                        color=alt.Color("Region:N"),
+                        tooltip=["State", "Region", alt.Tooltip("Predicted:Q", format=".2f")]
+                    )
+                    .properties(height=max(120, 22 * len(results))),
+                    use_container_width=True
+                )
+
+        if results:
+            compare_df = pd.DataFrame(results).sort_values(["Region", "State"])
+            compare_df["Change (%)"] = (
+                (compare_df["Predicted"] - compare_df["Last Load"]) / compare_df["Last Load"] * 100
+            )
+
+            # =================================================
+            # REGIONAL TOTALS
+            # =================================================
+            st.subheader("🏭 Regional Totals")
+            totals = (
+                compare_df.groupby("Region", as_index=False)[["Last Load", "Predicted"]].sum()
+            )
+            totals["Change (%)"] = (totals["Predicted"] - totals["Last Load"]) / totals["Last Load"] * 100
+
+            t1, t2 = st.columns(2)
+            with t1:
+                st.metric("⚡ Total Last Actual Load", f"{totals['Last Load'].sum():.2f} GWh")
+            with t2:
+                st.metric(
+                    "🔮 Total Predicted Load",
+                    f"{totals['Predicted'].sum():.2f} GWh",
+                    f"{(totals['Predicted'].sum() / totals['Last Load'].sum() - 1) * 100:+.2f}%"
+                )
+
+            st.dataframe(totals.round(2), hide_index=True, use_container_width=True)
+            with st.expander("Per-state forecasts"):
+                st.dataframe(compare_df.round(2), hide_index=True, use_container_width=True)
+
+            st.caption(
+                f"Forecasts for {compare_date.strftime('%d/%m/%Y')}, computed on "
+                f"{COMPARE_WORKERS} threads. Last actual loads are each state's most "
+                "recent reading, so states with older data compare over longer horizons."
+            )
+
+    st.stop()
 
 # =========================================================
 # STATE SELECTION
 # =========================================================
 st.subheader("📍 Select State")
-selected_state = st.selectbox("State", states, index=0)
+selected_state = st.selectbox("State", ["Select State"] + states, index=0)
 
 if selected_state == "Select State":
     st.info("Please select a state to continue.")
     st.stop()
 
 # =========================================================
-# LOAD STATE DATA
+# LOAD STATE SUMMARY
 # =========================================================
-@st.cache_data(show_spinner=False)
-def load_state_data(state):
-    path = os.path.join(FEATURE_DIR, f"{state}_features.csv")
-    df = pd.read_csv(path)
-    df["date"] = pd.to_datetime(df["date"])
-    return df
+summary = state_summary(selected_state)
 
-df = load_state_data(selected_state)
+# Lookback tail the recursive forecast starts from
+history_df = summary_frame(summary, "tail")
+
+# Daily by default; hourly or 15-minute data forecasts every period
+data_freq = summary["freq"]
+periods = periods_per_day(data_freq)
 
 # =========================================================
 # LOAD MODEL
 # =========================================================
-@st.cache_resource
-def load_model(path):
-    return joblib.load(path)
-
-model_path = os.path.join(MODEL_DIR, f"{selected_state}_model.pkl")
-
-if not os.path.exists(model_path):
+if not model_exists(selected_state, MODEL_DIR):
     st.error(f"Trained model not found for {selected_state}.")
     st.stop()
 
-model = load_model(model_path)
+with stage("app.model_load", log=False, state=selected_state):
+    # The fingerprint of the artifact this model was loaded from keys its
+    # cached forecasts; the cache reloads the model after a retrain
+    model, model_hash = get_model_cache().get(selected_state)
+    predictor = make_predictor(model)
 
 # =========================================================
 # MODEL INFORMATION (RESTORED, CLEAN)
 # =========================================================
+serving_model = artifact_name(selected_state, MODEL_DIR)
+model_metadata = read_metadata(serving_model, MODEL_DIR) or {}
+
 st.subheader("🤖 Model Information")
 st.markdown(
     f"""
     • **State:** {selected_state}  
-    • **Model Type:** Random Forest Regressor  
-    • **Training Approach:** Independent state-wise model  
-    • **Data Frequency:** Daily electricity consumption  
+    • **Model Type:** {engine_label(model_metadata.get("engine", DEFAULT_ENGINE))}  
+    • **Training Approach:** {"Global cross-state model" if serving_model == GLOBAL_MODEL else "Independent state-wise model"}  
+    • **Data Frequency:** {"Daily" if periods == 1 else f"Intraday, {periods} readings per day,"} electricity consumption  
     """
 )
 
 # =========================================================
 # LAST & AVERAGE LOAD
 # =========================================================
-last_available_date = df["date"].max()
-last_actual_load = df.loc[df["date"] == last_available_date, "load"].iloc[0]
-window = min(30, len(df))
-avg_30_day_load = df.tail(window)["load"].mean()
+last_available_date = pd.Timestamp(summary["last_date"])
+last_actual_load = summary["last_load"]
+avg_30_day_load = summary["mean_30d"]
 
 c1, c2 = st.columns(2)
 with c1:
@@ -163,7 +357,7 @@ with c2:
 # =========================================================
 st.subheader("📈 Recent Electricity Consumption Trend (Last 30 Days)")
 
-trend_df = df.tail(window)[["date", "load"]]
+trend_df = summary_frame(summary, "trend")
 
 trend_chart = (
     alt.Chart(trend_df)
@@ -177,6 +371,24 @@ trend_chart = (
 
 st.altair_chart(trend_chart, use_container_width=True)
 
+with st.expander("🗓️ Full History"):
+    history_chart = (
+        alt.Chart(summary_frame(summary, "history"))
+        .mark_line(color="#2F80ED", strokeWidth=1.5)
+        .encode(
+            x=alt.X("date:T", title="Date"),
+            y=alt.Y("load:Q", title="Electricity Load (GWh)")
+        )
+        .properties(height=240)
+    )
+    st.altair_chart(history_chart, use_container_width=True)
+    bucket_days = summary["history"]["bucket_days"]
+    st.caption(
+        f"{summary['rows']} records from {summary['first_date']} to "
+        f"{summary['last_date']}, shown as "
+        + ("daily averages." if bucket_days == 1 else f"{bucket_days}-day averages.")
+    )
+
 # =========================================================
 # DATE INPUT
 # =========================================================
@@ -197,7 +409,13 @@ if st.button("🔮 Predict Load"):
         st.error("Please select a future date beyond the last available data.")
         st.stop()
 
-    days_ahead = (pd.to_datetime(selected_date) - last_available_date).days
+    days_ahead = (pd.to_datetime(selected_date) - last_available_date.normalize()).days
+    # Up to the selected day's last period
+    steps = steps_until(
+        last_available_date,
+        pd.to_datetime(selected_date) + pd.Timedelta(days=1) - period(data_freq),
+        data_freq
+    )
     horizon = "day ahead" if days_ahead == 1 else "days ahead"
 
     st.info(
@@ -206,25 +424,41 @@ if st.button("🔮 Predict Load"):
         f"({days_ahead} {horizon})."
     )
 
-    last_row = df.iloc[-1].copy()
-    features = last_row.drop(["date", "load"])
-    current_date = last_available_date
-
     with st.spinner("Predicting future electricity load..."):
-        for _ in range(days_ahead):
-            prediction = model.predict(pd.DataFrame([features]))[0]
-
-            features["lag_7"] = features["lag_1"]
-            features["lag_1"] = prediction
-            features["rolling_mean_7"] = (
-                features["rolling_mean_7"] * 6 + prediction
-            ) / 7
-
-            next_date = current_date + timedelta(days=1)
-            features["day"] = next_date.day
-            features["month"] = next_date.month
-            features["weekday"] = next_date.weekday()
-            current_date = next_date
+        # Same state, data cutoff and model reuse the cached runs
+        key = forecast_key(selected_state, last_available_date, model_hash)
+        forecast_cache = get_forecast_cache()
+
+        # Bands from sampled tree trajectories, whose first path is the
+        # point forecast; engines without per-tree predictions get the
+        # point forecast only
+        if make_tree_sampler(model) is not None:
+            with stage("app.intervals", log=False, state=selected_state):
+                interval_df = forecast_cache.intervals(
+                    key,
+                    model,
+                    history_df,
+                    steps,
+                    predictor=predictor,
+                    freq=data_freq
+                )
+            forecast_df = interval_df
+        else:
+            interval_df = None
+            with stage("app.predict", log=False, state=selected_state):
+                forecast_df = forecast_cache.forecast(
+                    key,
+                    model,
+                    history_df,
+                    steps,
+                    predictor=predictor,
+                    freq=data_freq
+                )
+
+        # The selected day's load: its single row for daily data, the mean
+        # of its periods for intraday data
+        selected_rows = forecast_df["date"].dt.normalize() == pd.to_datetime(selected_date)
+        prediction = forecast_df.loc[selected_rows, "prediction"].mean()
 
     # =====================================================
     # COMPARISON
@@ -275,6 +509,46 @@ if st.button("🔮 Predict Load"):
         unsafe_allow_html=True
     )
 
+    # =====================================================
+    # PREDICTION INTERVAL
+    # =====================================================
+    if interval_df is not None:
+        low_q, high_q = DEFAULT_QUANTILES[0], DEFAULT_QUANTILES[-1]
+        # Escaped, as Altair reads dots in field names as nesting
+        low_col, high_col = (
+            quantile_column(q).replace(".", "\\.") for q in (low_q, high_q)
+        )
+        coverage = round((high_q - low_q) * 100)
+
+        st.subheader(f"📐 {coverage}% Prediction Interval")
+        st.markdown(
+            f"""
+            <div style="text-align:center;">
+                <span style="font-size:20px; font-weight:600;">
+                    {interval_df.loc[selected_rows, quantile_column(low_q)].mean():.2f} –
+                    {interval_df.loc[selected_rows, quantile_column(high_q)].mean():.2f} GWh
+                </span>
+            </div>
+            """,
+            unsafe_allow_html=True
+        )
+
+        band = (
+            alt.Chart(interval_df)
+            .mark_area(color="#2F80ED", opacity=0.2)
+            .encode(
+                x=alt.X("date:T", title="Date"),
+                y=alt.Y(f"{low_col}:Q", title="Electricity Load (GWh)"),
+                y2=f"{high_col}:Q"
+            )
+        )
+        line = (
+            alt.Chart(interval_df)
+            .mark_line(color="#2F80ED", strokeWidth=2)
+            .encode(x="date:T", y="prediction:Q")
+        )
+        st.altair_chart((band + line).properties(height=280), use_container_width=True)
+
     # =====================================================
     # PREDICTION CONFIDENCE DISCLAIMER (NEW)
     # =====================================================
@@ -287,6 +561,27 @@ if st.button("🔮 Predict Load"):
 
     st.caption("Note: GWh and MU (Million Units) are equivalent energy units.")
 
+# =========================================================
+# PERFORMANCE COUNTERS
+# =========================================================
+with st.expander("⏱️ Performance"):
+    counters = COUNTERS.snapshot()
+    rows = [
+        {
+            "Operation": name.replace("app.", "").replace("_", " ").title(),
+            "Calls": stats["count"],
+            "Last (ms)": round(stats["last_seconds"] * 1000, 2),
+            "Mean (ms)": round(stats["mean_seconds"] * 1000, 2),
+            "Max (ms)": round(stats["max_seconds"] * 1000, 2),
+        }
+        for name, stats in sorted(counters.items())
+        if name.startswith("app.")
+    ]
+    if rows:
+        st.dataframe(pd.DataFrame(rows), hide_index=True, use_container_width=True)
+    else:
+        st.caption("No model loads or predictions yet in this server process.")
+
 # =========================================================
 # PROJECT INFORMATION (LARGER TEXT)
 # =========================================================
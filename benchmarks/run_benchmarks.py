@@ -0,0 +1,250 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from feature_engineering_all_states import create_features_long  # noqa: E402
+from forecasting import make_predictor, recursive_forecast  # noqa: E402
+from model_store import load_model  # noqa: E402
+from preprocess_all_states import clean_long  # noqa: E402
+from storage import get_storage  # noqa: E402
+from train_models_all_states import train_state  # noqa: E402
+
+# ===============================
+# PATHS
+# ===============================
+BASELINE_PATH = os.path.join(ROOT, "benchmarks", "baseline.json")
+
+
+# ===============================
+# SYNTHETIC DATA
+# ===============================
+def synthetic_raw(n_states, n_years, seed=42):
+    """Wide raw table shaped like data/raw/electricity_load.csv.
+
+    Each state gets its own level, trend, yearly and weekly seasonality and
+    noise, so the models have realistic structure to learn. The same seed
+    always produces the same table.
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2015-01-01", periods=int(365 * n_years), freq="D")
+    t = np.arange(len(dates))
+
+    data = {"date": dates.strftime("%d/%m/%Y %H:%M:%S")}
+    for i in range(n_states):
+        level = rng.uniform(5, 400)
+        yearly = level * rng.uniform(0.05, 0.25) * np.sin(2 * np.pi * (t / 365.25 + rng.uniform()))
+        weekly = level * 0.03 * (dates.weekday >= 5)
+        trend = level * rng.uniform(0, 0.0002) * t
+        noise = rng.normal(0, level * 0.03, len(t))
+        data[f"State_{i:03d}"] = np.round(level + yearly - weekly + trend + noise, 1)
+
+    return pd.DataFrame(data)
+
+
+# ===============================
+# MEASUREMENT
+# ===============================
+def measure(func, repeat=1):
+    """Best wall time over ``repeat`` runs, plus traced peak memory."""
+    tracemalloc.start()
+    result = func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        seconds.append(time.perf_counter() - start)
+
+    return result, min(seconds), peak / 1024 ** 2
+
+
+def record(results, name, seconds, peak_mb, units, unit_name):
+    results[name] = {
+        "seconds": round(seconds, 6),
+        "peak_mb": round(peak_mb, 3),
+        "throughput": round(units / seconds, 2) if seconds else None,
+        "throughput_unit": f"{unit_name}/s",
+    }
+    print(
+        f"{name:<20} {seconds:>9.4f} s  {peak_mb:>9.2f} MB peak  "
+        f"{units / seconds if seconds else float('inf'):>12.1f} {unit_name}/s"
+    )
+
+
+# ===============================
+# BENCHMARKS
+# ===============================
+def run(args):
+    results = {}
+    raw = synthetic_raw(args.states, args.years, args.seed)
+    n_rows = raw.shape[0] * (raw.shape[1] - 1)
+
+    print(f"Synthetic data: {args.states} states x {args.years} years = {n_rows} rows")
+
+    # Stages read/write relative paths, so run inside a scratch directory
+    with tempfile.TemporaryDirectory() as workdir:
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            storage = get_storage(args.storage)
+            raw_path = os.path.join(workdir, "electricity_load.csv")
+            raw.to_csv(raw_path, index=False)
+
+            # Same steps as preprocess_all_states.main: parsing the raw file
+            # is part of the cost
+            def preprocess():
+                df = pd.read_csv(raw_path)
+                if df.columns[0] != "date":
+                    df.rename(columns={df.columns[0]: "date"}, inplace=True)
+                df["date"] = pd.to_datetime(df["date"], dayfirst=True)
+                long_df = clean_long(df)
+                storage.write_all("processed", long_df)
+                return long_df
+
+            long_df, seconds, peak = measure(preprocess, args.repeat)
+            record(results, "preprocess", seconds, peak, n_rows, "rows")
+
+            def features():
+                feature_df = create_features_long(storage.read_all("processed"))
+                storage.write_all("features", feature_df)
+                return feature_df
+
+            feature_df, seconds, peak = measure(features, args.repeat)
+            record(results, "feature_engineering", seconds, peak, n_rows, "rows")
+
+            states = storage.list_states("features")
+            train_rows = len(feature_df)
+
+            def train():
+                return [train_state(state, storage) for state in states]
+
+            _, seconds, peak = measure(train, 1)
+            record(results, "training", seconds, peak, train_rows, "rows")
+
+            def load():
+                return [load_model(state) for state in states]
+
+            models, seconds, peak = measure(load, args.repeat)
+            record(results, "model_load", seconds, peak, len(states), "models")
+
+            histories = [storage.read_state("features", s)[["date", "load"]] for s in states]
+
+            def forecast():
+                return [
+                    recursive_forecast(model, history, args.horizon, predictor=make_predictor(model))
+                    for model, history in zip(models, histories)
+                ]
+
+            _, seconds, peak = measure(forecast, args.repeat)
+            record(results, "forecast", seconds, peak, len(states) * args.horizon, "steps")
+        finally:
+            os.chdir(cwd)
+
+    return results
+
+
+# ===============================
+# BASELINE COMPARISON
+# ===============================
+def compare(results, baseline, tolerance):
+    regressions = []
+    print(f"\nComparison with baseline (tolerance {tolerance:.0%}):")
+
+    for name, current in results.items():
+        if name not in baseline:
+            continue
+        before = baseline[name]["seconds"]
+        change = (current["seconds"] - before) / before if before else 0.0
+        flag = "REGRESSION" if change > tolerance else "ok"
+        if flag != "ok":
+            regressions.append(name)
+        print(f"{name:<20} {before:>9.4f} s -> {current['seconds']:>9.4f} s  {change:+7.1%}  {flag}")
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the pipeline and forecasting hot paths on synthetic data."
+    )
+    parser.add_argument("--states", type=int, default=10)
+    parser.add_argument("--years", type=float, default=3)
+    parser.add_argument("--horizon", type=int, default=90, help="Forecast steps per state.")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per stage (best kept).")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--storage", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--output", help="Write results as JSON to this path.")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="Store these results as the new baseline instead of comparing."
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="Allowed slowdown vs. baseline before flagging (0.2 = 20%%)."
+    )
+    args = parser.parse_args()
+
+    results = run(args)
+
+    report = {
+        "config": {
+            "states": args.states,
+            "years": args.years,
+            "horizon": args.horizon,
+            "storage": args.storage,
+            "seed": args.seed,
+        },
+        "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n📌 Baseline saved to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print("\nNo baseline found; run with --save-baseline to create one.")
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+    # Timings from another data size or storage are not comparable
+    if baseline.get("config") != report["config"]:
+        print(f"\n❌ Baseline was recorded with a different configuration: {baseline.get('config')}")
+        print(f"   This run used {report['config']}; rerun with those options or --save-baseline.")
+        sys.exit(1)
+
+    regressions = compare(results, baseline["results"], args.tolerance)
+    if regressions:
+        print(f"\n❌ Regressions: {', '.join(regressions)}")
+        sys.exit(1)
+
+    print("\n✅ No regressions.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+import argparse
+import json
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from estimators import DEFAULT_ENGINE, ENGINES, PRESETS_PATH, load_presets, resolve_preset
+from forecasting import recursive_forecast
+from instrumentation import run, stage
+from storage import add_storage_argument, get_storage
+from train_models_all_states import fit_model, split_cores
+
+# ===============================
+# PATHS
+# ===============================
+RESULTS_PATH = "results/backtest.csv"
+FOLDS_PATH = "results/backtest_folds.csv"
+
+DEFAULT_HORIZONS = (1, 7, 14, 30)
+
+# Parameter --trees overrides, per engine
+TREE_PARAMS = {"hist_gradient_boosting": "max_iter"}
+
+
+# ===============================
+# ROLLING ORIGINS
+# ===============================
+def cutoffs(n_rows, folds, step, max_horizon, min_train):
+    """Row indices where each fold's training data ends, oldest first.
+
+    The latest origin leaves ``max_horizon`` rows to score against; each
+    earlier one is ``step`` rows before it.
+    """
+    last = n_rows - max_horizon
+    origins = [last - i * step for i in range(folds)]
+    return sorted(c for c in origins if c >= min_train)
+
+
+# ===============================
+# SHARED MATRICES
+# ===============================
+def save_matrices(df, directory):
+    """Write a state's feature matrix, loads and dates once for every fold.
+
+    Folds memory-map these files and slice them at their cutoff, so a task
+    carries a path and a row index instead of pickled copies of the data.
+    """
+    os.makedirs(directory)
+    X = df.drop(columns=["date", "load"])
+    np.save(os.path.join(directory, "X.npy"), X.to_numpy(dtype=np.float64))
+    np.save(os.path.join(directory, "load.npy"), df["load"].to_numpy(dtype=np.float64))
+    np.save(os.path.join(directory, "date.npy"), df["date"].to_numpy())
+    with open(os.path.join(directory, "columns.json"), "w") as f:
+        json.dump(list(X.columns), f)
+
+
+def load_matrices(directory):
+    with open(os.path.join(directory, "columns.json")) as f:
+        columns = json.load(f)
+    arrays = [
+        np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+        for name in ("X", "load", "date")
+    ]
+    return (columns, *arrays)
+
+
+# ===============================
+# ONE FOLD
+# ===============================
+def run_fold(state, directory, cutoff, engine, params, horizons, n_jobs=1, n_estimators=None):
+    # The engine and parameters are the ones training resolves for the
+    # state, so folds score the estimator that serves it
+    if n_estimators:
+        params = dict(params, **{TREE_PARAMS.get(engine, "n_estimators"): n_estimators})
+
+    columns, X, load, dates = load_matrices(directory)
+    history = pd.DataFrame({"date": dates, "load": load})
+
+    with stage("backtest.fold", state=state, cutoff=cutoff, engine=engine) as record:
+        model = fit_model(
+            engine, params, pd.DataFrame(X[:cutoff], columns=columns), pd.Series(load[:cutoff]), n_jobs
+        )
+        forecast = recursive_forecast(model, history.iloc[:cutoff], max(horizons))
+        record.rows = cutoff
+
+    actual = history.iloc[cutoff:].set_index("date")["load"]
+    origin = history["date"].iloc[cutoff - 1]
+
+    rows = []
+    for h in horizons:
+        date = forecast["date"].iloc[h - 1]
+        # Periods missing from the data cannot be scored
+        if date not in actual.index:
+            continue
+        prediction = forecast["prediction"].iloc[h - 1]
+        rows.append({
+            "State": state,
+            "Origin": origin,
+            "Horizon": h,
+            "Date": date,
+            "Actual": actual.loc[date],
+            "Prediction": prediction,
+            "Error": prediction - actual.loc[date],
+        })
+    return rows
+
+
+# ===============================
+# SCORING
+# ===============================
+def summarize(folds_df):
+    grouped = folds_df.groupby(["State", "Horizon"])["Error"]
+    return pd.DataFrame({
+        "MAE": grouped.apply(lambda e: np.abs(e).mean()),
+        "RMSE": grouped.apply(lambda e: np.sqrt((e ** 2).mean())),
+        "Folds": grouped.size(),
+    }).reset_index()
+
+
+# ===============================
+# BACKTEST ALL STATES
+# ===============================
+def main():
+    parser = argparse.ArgumentParser(
+        description="Walk-forward backtest of the recursive multi-day forecaster."
+    )
+    parser.add_argument("--folds", type=int, default=5, help="Forecast origins per state.")
+    parser.add_argument("--step", type=int, default=30, help="Rows between origins.")
+    parser.add_argument(
+        "--horizons",
+        type=int,
+        nargs="+",
+        default=list(DEFAULT_HORIZONS),
+        help="Periods ahead to score: days for daily data, e.g. 24 per day for "
+             "hourly data (default: %(default)s)."
+    )
+    parser.add_argument(
+        "--min-train",
+        type=int,
+        default=180,
+        help="Skip origins with fewer training rows than this."
+    )
+    parser.add_argument(
+        "--trees",
+        type=int,
+        help="Override the number of trees (boosting iterations) per fold model "
+             "for quicker runs."
+    )
+    parser.add_argument(
+        "--engine",
+        choices=list(ENGINES),
+        help=f"Estimator for states without a preset (default: {DEFAULT_ENGINE})."
+    )
+    parser.add_argument(
+        "--presets",
+        default=PRESETS_PATH,
+        help="JSON file of per-state engines and hyperparameters (default: %(default)s)."
+    )
+    parser.add_argument("--states", nargs="+", help="Only backtest these states.")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Parallel fold processes (0 = one per CPU core, 1 = no pool)."
+    )
+    add_storage_argument(parser)
+    args = parser.parse_args()
+
+    storage = get_storage(args.storage)
+    states = args.states or storage.list_states("features")
+    horizons = sorted(set(args.horizons))
+    presets = load_presets(args.presets)
+
+    # ===============================
+    # FEATURE MATRICES (ONCE PER STATE)
+    # ===============================
+    with tempfile.TemporaryDirectory() as matrix_dir:
+        tasks = []
+        for i, state in enumerate(states):
+            df = storage.read_state("features", state)
+            directory = os.path.join(matrix_dir, str(i))
+            save_matrices(df, directory)
+            engine, params = resolve_preset(state, presets, args.engine)
+
+            for cutoff in cutoffs(len(df), args.folds, args.step, max(horizons), args.min_train):
+                tasks.append((state, directory, cutoff, engine, params))
+
+        if not tasks:
+            parser.error("No folds to run; lower --min-train or --folds")
+
+        workers, tree_jobs = split_cores(args.workers, len(tasks))
+        print(f"Backtesting {len(states)} states, {len(tasks)} folds on {workers} workers.")
+
+        # ===============================
+        # RUN FOLDS
+        # ===============================
+        if workers == 1:
+            fold_rows = [
+                run_fold(*task, horizons, -1, args.trees) for task in tasks
+            ]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [
+                    executor.submit(run_fold, *task, horizons, tree_jobs, args.trees)
+                    for task in tasks
+                ]
+                fold_rows = [future.result() for future in futures]
+
+    folds_df = pd.DataFrame([row for rows in fold_rows for row in rows])
+    results_df = summarize(folds_df)
+
+    os.makedirs("results", exist_ok=True)
+    folds_df.to_csv(FOLDS_PATH, index=False)
+    results_df.to_csv(RESULTS_PATH, index=False)
+
+    print(results_df.groupby("Horizon")[["MAE", "RMSE"]].mean().round(2))
+    print(f"📊 Backtest summary saved to {RESULTS_PATH} (per fold: {FOLDS_PATH})")
+
+
+if __name__ == "__main__":
+    run(main, "backtest")
@@ -0,0 +1,155 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from forecasting import (
+    DEFAULT_PATHS,
+    DEFAULT_QUANTILES,
+    forecast_intervals,
+    recursive_forecast,
+)
+from instrumentation import run, stage
+from model_store import MODEL_DIR, load_model, model_exists
+from storage import add_storage_argument, get_storage
+
+# ===============================
+# PATHS
+# ===============================
+OUTPUT_PATH = "results/forecasts.csv"
+
+
+# ===============================
+# FORECAST ONE STATE
+# ===============================
+def forecast_state(
+    state,
+    horizon,
+    storage,
+    model_dir=MODEL_DIR,
+    quantiles=None,
+    paths=DEFAULT_PATHS,
+):
+    # Each call holds a single model, so a worker's memory stays at one
+    # model plus one history however many states it processes
+    history = storage.read_state("features", state)[["date", "load"]]
+
+    with stage("batch_forecast.model_load", state=state):
+        model = load_model(state, model_dir)
+
+    with stage("batch_forecast.predict", state=state, horizon=horizon) as record:
+        forecast_df = None
+        if quantiles:
+            try:
+                forecast_df = forecast_intervals(model, history, horizon, quantiles, paths)
+            except TypeError as exc:
+                print(f"⚠️ No intervals for {state}: {exc}")
+        if forecast_df is None:
+            forecast_df = recursive_forecast(model, history, horizon)
+        record.rows = horizon
+
+    forecast_df.insert(0, "state", state)
+    forecast_df.insert(2, "horizon", range(1, horizon + 1))
+    return forecast_df
+
+
+# ===============================
+# FORECAST ALL STATES
+# ===============================
+def main():
+    parser = argparse.ArgumentParser(
+        description="Forecast every state up to a horizon and write one table."
+    )
+    parser.add_argument(
+        "--horizon",
+        type=int,
+        default=30,
+        help="Periods to forecast after each state's last available date "
+             "(days for daily data, e.g. 15-minute steps for intraday data)."
+    )
+    parser.add_argument(
+        "--states",
+        nargs="+",
+        help="Only forecast these states (default: every state with a model)."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Parallel worker processes (0 = one per CPU core, 1 = no pool)."
+    )
+    parser.add_argument(
+        "--intervals",
+        action="store_true",
+        help="Add quantile columns from sampled tree-ensemble trajectories."
+    )
+    parser.add_argument(
+        "--quantiles",
+        type=float,
+        nargs="+",
+        default=list(DEFAULT_QUANTILES),
+        help="Quantiles written with --intervals (default: %(default)s)."
+    )
+    parser.add_argument(
+        "--paths",
+        type=int,
+        default=DEFAULT_PATHS,
+        help="Sampled trajectories per state for --intervals."
+    )
+    parser.add_argument("--output", default=OUTPUT_PATH)
+    parser.add_argument("--model-dir", default=MODEL_DIR)
+    add_storage_argument(parser)
+    args = parser.parse_args()
+
+    if args.horizon < 1:
+        parser.error("--horizon must be at least 1")
+
+    quantiles = sorted(args.quantiles) if args.intervals else None
+
+    storage = get_storage(args.storage)
+    states = args.states or storage.list_states("features")
+
+    missing = [s for s in states if not model_exists(s, args.model_dir)]
+    for state in missing:
+        print(f"⚠️ Skipping {state}: no trained model")
+    states = [s for s in states if s not in missing]
+
+    if not states:
+        parser.error("No states with trained models to forecast")
+
+    workers = args.workers or os.cpu_count() or 1
+    workers = max(1, min(workers, len(states)))
+
+    if workers == 1:
+        frames = [
+            forecast_state(state, args.horizon, storage, args.model_dir, quantiles, args.paths)
+            for state in states
+        ]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # map preserves input order, so output is deterministic
+            frames = list(executor.map(
+                forecast_state,
+                states,
+                [args.horizon] * len(states),
+                [storage] * len(states),
+                [args.model_dir] * len(states),
+                [quantiles] * len(states),
+                [args.paths] * len(states),
+            ))
+
+    # ===============================
+    # SAVE TIDY OUTPUT
+    # ===============================
+    forecasts = pd.concat(frames, ignore_index=True)
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    forecasts.to_csv(args.output, index=False)
+
+    print(f"✅ Forecast {len(states)} states x {args.horizon} steps on {workers} workers.")
+    print(f"📊 Forecasts saved to {args.output}")
+
+
+if __name__ == "__main__":
+    run(main, "batch_forecast")
@@ -0,0 +1,245 @@
+import argparse
+import hashlib
+import json
+import math
+import os
+
+import pandas as pd
+
+from feature_state import format_timestamp, infer_freq, parse_feature_columns, periods_per_day
+from instrumentation import path_size, run, stage
+from storage import add_storage_argument, get_storage
+
+# ===============================
+# PATHS
+# ===============================
+# One small JSON document per state with everything the app shows before
+# a forecast, so page renders never read the full feature history
+SUMMARY_DIR = "data/summary"
+
+# Days in the recent-trend chart and the headline averages
+TREND_DAYS = 30
+
+# Upper bound on points in the downsampled full-history series
+MAX_HISTORY_POINTS = 500
+
+
+def summary_path(state, summary_dir=SUMMARY_DIR):
+    return os.path.join(summary_dir, f"{state}.json")
+
+
+# ===============================
+# SOURCE FINGERPRINT
+# ===============================
+def source_stamp(storage, state):
+    """Cheap fingerprint of a state's feature data.
+
+    File names and sizes plus the final bytes of the last file: appending
+    or rewriting rows changes it, and it does not depend on modification
+    times, so a fresh checkout of unchanged data still matches.
+    """
+    location = storage.location("features", state)
+    if os.path.isdir(location):
+        files = sorted(
+            os.path.join(location, name) for name in os.listdir(location)
+            if not name.startswith(".")
+        )
+    else:
+        files = [location]
+
+    digest = hashlib.sha1()
+    for path in files:
+        digest.update(f"{os.path.basename(path)}:{os.path.getsize(path)}".encode("utf-8"))
+    with open(files[-1], "rb") as f:
+        f.seek(max(0, os.path.getsize(files[-1]) - 4096))
+        digest.update(f.read())
+    return digest.hexdigest()
+
+
+# ===============================
+# BUILD
+# ===============================
+def _series(df):
+    return {
+        "date": [format_timestamp(date) for date in df["date"]],
+        "load": [float(load) for load in df["load"]],
+    }
+
+
+def bucket_days(first_date, last_date, max_points=MAX_HISTORY_POINTS):
+    """Days per full-history bucket for data spanning these dates."""
+    return max(1, math.ceil((last_date - first_date) / pd.Timedelta(days=max_points)))
+
+
+def downsample(df, max_points=MAX_HISTORY_POINTS, first_date=None):
+    """Mean load per equal time bucket, at most ``max_points`` buckets.
+
+    Buckets start at midnight of ``first_date`` (default: the first row),
+    so a table's later rows fall in the same buckets whether or not its
+    earlier rows are passed.
+    """
+    if first_date is None:
+        first_date = df["date"].iloc[0]
+    days = bucket_days(first_date, df["date"].iloc[-1], max_points)
+    history = (
+        df.set_index("date")["load"]
+        # Hours, not days: only fixed-length bins take an origin
+        .resample(f"{24 * days}h", origin=first_date.normalize())
+        .mean()
+        .dropna()
+        .reset_index()
+    )
+    return history, days
+
+
+def summarize(df, stamp=None, previous=None):
+    """Dashboard summary of one state's feature table.
+
+    Holds the last date and load, recent averages, the recent trend, a
+    downsampled full history and the lookback tail recursive forecasts
+    start from (exact loads, so forecasts from it match the full table),
+    all as plain JSON values.
+
+    With ``previous``, the summary of the same table before rows were
+    appended, ``df`` only needs the rows from the start of a history
+    bucket that covers the new trend and tail; earlier buckets and the
+    row count come from ``previous``.
+    """
+    freq = previous["freq"] if previous else infer_freq(df["date"])
+    periods = periods_per_day(freq)
+
+    lags, windows = parse_feature_columns(df.columns)
+    lookback = max(lags + windows, default=1)
+
+    recent = df.tail(TREND_DAYS * periods)
+    week = df.tail(7 * periods)
+
+    if previous is None:
+        first_date = df["date"].iloc[0]
+        rows = len(df)
+        history, days = downsample(df)
+    else:
+        first_date = pd.Timestamp(previous["first_date"])
+        rows = previous["rows"] + int((df["date"] > pd.Timestamp(previous["last_date"])).sum())
+        history, days = downsample(df, first_date=first_date)
+        earlier = summary_frame(previous, "history")
+        earlier = earlier[earlier["date"] < history["date"].iloc[0]]
+        history = pd.concat([earlier, history], ignore_index=True)
+
+    return {
+        "stamp": stamp,
+        "freq": freq,
+        "rows": rows,
+        "first_date": format_timestamp(first_date),
+        "last_date": format_timestamp(df["date"].iloc[-1]),
+        "last_load": float(df["load"].iloc[-1]),
+        "mean_7d": float(week["load"].mean()),
+        "mean_30d": float(recent["load"].mean()),
+        "min_30d": float(recent["load"].min()),
+        "max_30d": float(recent["load"].max()),
+        "trend": _series(recent),
+        "history": dict(_series(history), bucket_days=days),
+        "tail": _series(df.tail(lookback)),
+    }
+
+
+def _write(summary, state, summary_dir):
+    os.makedirs(summary_dir, exist_ok=True)
+    path = summary_path(state, summary_dir)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(summary, f, separators=(",", ":"))
+    os.replace(temp_path, path)
+    return path
+
+
+def write_summary(storage, state, df=None, summary_dir=SUMMARY_DIR):
+    if df is None:
+        df = storage.read_state("features", state)
+    return _write(summarize(df, source_stamp(storage, state)), state, summary_dir)
+
+
+def update_summary(storage, state, last_date, summary_dir=SUMMARY_DIR):
+    """Refresh a state's summary after rows dated after ``last_date`` were appended.
+
+    Reads only the rows from the start of the history bucket holding the
+    earliest of the previous trend, tail and last bucket, so the cost
+    follows the appended rows rather than the state's history. Rebuilds
+    from the full table when there is no summary up to ``last_date`` or
+    the new rows make the history buckets wider.
+    """
+    path = summary_path(state, summary_dir)
+    previous = None
+    if os.path.exists(path):
+        with open(path) as f:
+            previous = json.load(f)
+    if previous is None or previous["last_date"] != format_timestamp(pd.Timestamp(last_date)):
+        return write_summary(storage, state, summary_dir=summary_dir)
+
+    first_date = pd.Timestamp(previous["first_date"])
+    origin = first_date.normalize()
+    bucket = pd.Timedelta(days=previous["history"]["bucket_days"])
+    start = min(
+        pd.Timestamp(previous[key]["date"][0]) for key in ("trend", "tail")
+    )
+    start = min(start, pd.Timestamp(previous["history"]["date"][-1]))
+    since = origin + (start - origin) // bucket * bucket
+
+    df = storage.read_state("features", state, since=since)
+    if bucket_days(first_date, df["date"].iloc[-1]) != previous["history"]["bucket_days"]:
+        return write_summary(storage, state, summary_dir=summary_dir)
+
+    summary = summarize(df, source_stamp(storage, state), previous)
+    return _write(summary, state, summary_dir)
+
+
+# ===============================
+# READ
+# ===============================
+def read_summary(storage, state, summary_dir=SUMMARY_DIR, stamp=None):
+    """A state's summary, or None when missing or older than its feature data."""
+    path = summary_path(state, summary_dir)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        summary = json.load(f)
+    if summary.get("stamp") != (stamp or source_stamp(storage, state)):
+        return None
+    return summary
+
+
+def summary_frame(summary, key):
+    """``trend``, ``history`` or ``tail`` as a (date, load) DataFrame."""
+    series = summary[key]
+    return pd.DataFrame({
+        "date": pd.to_datetime(series["date"], format="ISO8601"),
+        "load": series["load"],
+    })
+
+
+# ===============================
+# BUILD ALL STATES
+# ===============================
+def main():
+    parser = argparse.ArgumentParser(
+        description="Precompute the per-state dashboard summaries the app loads."
+    )
+    parser.add_argument("--states", nargs="+", help="Only summarize these states.")
+    parser.add_argument("--summary-dir", default=SUMMARY_DIR)
+    add_storage_argument(parser)
+    args = parser.parse_args()
+
+    storage = get_storage(args.storage)
+    states = args.states or storage.list_states("features")
+
+    for state in states:
+        with stage("summary.write", state=state) as record:
+            path = write_summary(storage, state, summary_dir=args.summary_dir)
+            record.bytes_written = path_size(path)
+        print(f"Summarized {state} ({path_size(path) / 1024:.1f} KB)")
+
+    print(f"✅ Dashboard summaries written to {args.summary_dir}/")
+
+
+if __name__ == "__main__":
+    run(main, "dashboard_summary")
@@ -0,0 +1,215 @@
+import json
+import os
+
+# ===============================
+# PATHS
+# ===============================
+# Optional per-state engine and hyperparameter presets:
+# {"default": {"engine": ..., "params": {...}},
+#  "states": {"<State>": {"engine": ..., "params": {...}}}}
+PRESETS_PATH = "config/model_presets.json"
+
+DEFAULT_ENGINE = "random_forest"
+
+
+# ===============================
+# ENGINE REGISTRY
+# ===============================
+# Estimator libraries are imported when an engine is built, so importing
+# this module (e.g. from the app) stays cheap.
+ENGINES = {}
+
+
+def register_engine(name, label, build, fit=None, defaults=None, warm_start=False):
+    """Make an estimator available to the training scripts.
+
+    ``build(n_jobs, params)`` returns an unfitted estimator and
+    ``fit(model, X, y, X_val, y_val)`` fits it, using the time-ordered
+    validation rows for early stopping when it can. ``warm_start`` marks
+    engines that incremental updates can grow.
+    """
+    ENGINES[name] = {
+        "label": label,
+        "build": build,
+        "fit": fit or _fit_plain,
+        "defaults": defaults or {},
+        "early_stopping": fit is not None,
+        "warm_start": warm_start,
+    }
+
+
+def _fit_plain(model, X, y, X_val=None, y_val=None):
+    model.fit(X, y)
+
+
+# -------------------------------
+# Random forest
+# -------------------------------
+def _build_random_forest(n_jobs, params):
+    from sklearn.ensemble import RandomForestRegressor
+
+    return RandomForestRegressor(n_jobs=n_jobs, **params)
+
+
+# -------------------------------
+# Histogram gradient boosting
+# -------------------------------
+def _build_hist_gradient_boosting(n_jobs, params):
+    # Threads come from OpenMP; there is no n_jobs parameter
+    from sklearn.ensemble import HistGradientBoostingRegressor
+
+    return HistGradientBoostingRegressor(**params)
+
+
+def _fit_hist_gradient_boosting(model, X, y, X_val=None, y_val=None):
+    if X_val is None:
+        # Its own validation split would be shuffled, leaking future rows
+        model.set_params(early_stopping=False)
+        model.fit(X, y)
+    else:
+        model.set_params(early_stopping=True)
+        model.fit(X, y, X_val=X_val, y_val=y_val)
+
+
+# -------------------------------
+# LightGBM / XGBoost (optional)
+# -------------------------------
+def _build_lightgbm(n_jobs, params):
+    import lightgbm
+
+    return lightgbm.LGBMRegressor(n_jobs=n_jobs, **params)
+
+
+def _fit_lightgbm(model, X, y, X_val=None, y_val=None):
+    import lightgbm
+
+    if X_val is None:
+        model.fit(X, y)
+    else:
+        model.fit(
+            X, y,
+            eval_set=[(X_val, y_val)],
+            callbacks=[lightgbm.early_stopping(20, verbose=False)],
+        )
+
+
+def _build_xgboost(n_jobs, params):
+    import xgboost
+
+    return xgboost.XGBRegressor(n_jobs=n_jobs, **params)
+
+
+def _fit_xgboost(model, X, y, X_val=None, y_val=None):
+    if X_val is None:
+        model.set_params(early_stopping_rounds=None)
+        model.fit(X, y)
+    else:
+        model.set_params(early_stopping_rounds=20)
+        model.fit(X, y, eval_set=[(X_val, y_val)], verbose=False)
+
+
+register_engine(
+    "random_forest",
+    "Random Forest Regressor",
+    _build_random_forest,
+    defaults={"n_estimators": 200, "random_state": 42},
+    warm_start=True,
+)
+register_engine(
+    "hist_gradient_boosting",
+    "Histogram Gradient Boosting Regressor",
+    _build_hist_gradient_boosting,
+    _fit_hist_gradient_boosting,
+    defaults={
+        "max_iter": 1000,
+        "learning_rate": 0.05,
+        "n_iter_no_change": 20,
+        "random_state": 42,
+    },
+)
+register_engine(
+    "lightgbm",
+    "LightGBM Regressor",
+    _build_lightgbm,
+    _fit_lightgbm,
+    defaults={"n_estimators": 1000, "learning_rate": 0.05, "random_state": 42, "verbose": -1},
+)
+register_engine(
+    "xgboost",
+    "XGBoost Regressor",
+    _build_xgboost,
+    _fit_xgboost,
+    defaults={"n_estimators": 1000, "learning_rate": 0.05, "tree_method": "hist", "random_state": 42},
+)
+
+
+# ===============================
+# BUILD / FIT
+# ===============================
+def _engine(name):
+    if name not in ENGINES:
+        raise ValueError(f"Unknown engine '{name}'. Choose from: {', '.join(ENGINES)}")
+    return ENGINES[name]
+
+
+def build_estimator(name=DEFAULT_ENGINE, n_jobs=-1, params=None):
+    engine = _engine(name)
+    return engine["build"](n_jobs, engine["defaults"] if params is None else params)
+
+
+def fit_estimator(name, model, X, y, X_val=None, y_val=None):
+    _engine(name)["fit"](model, X, y, X_val, y_val)
+    return model
+
+
+def engine_label(name):
+    return ENGINES[name]["label"] if name in ENGINES else name
+
+
+def n_trees(model):
+    """Trees a fitted model predicts with.
+
+    Boosting engines stop early, so their iteration count (scikit-learn's
+    ``n_iter_``, LightGBM's ``best_iteration_``) can be well below the
+    configured ``max_iter`` / ``n_estimators``.
+    """
+    for name in ("n_iter_", "best_iteration_"):
+        count = getattr(model, name, None)
+        if count:
+            return int(count)
+    count = getattr(model, "n_estimators", None)
+    return None if count is None else int(count)
+
+
+# ===============================
+# PRESETS
+# ===============================
+def load_presets(path=PRESETS_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def has_preset(state, presets):
+    """Whether ``presets`` choose an engine for ``state`` (its own or the default)."""
+    return bool(presets.get("states", {}).get(state) or presets.get("default"))
+
+
+def resolve_preset(state, presets, engine=None):
+    """Engine name and parameters to train ``state`` with.
+
+    A state's own entry wins over ``engine`` (e.g. from the command line),
+    which wins over the presets' default. Parameters start from the
+    engine's defaults, then the default entry's (when it is for the same
+    engine), then the state's.
+    """
+    default = presets.get("default", {})
+    entry = presets.get("states", {}).get(state, {})
+    name = entry.get("engine") or engine or default.get("engine") or DEFAULT_ENGINE
+
+    params = dict(_engine(name)["defaults"])
+    if default.get("engine", name) == name:
+        params.update(default.get("params", {}))
+    params.update(entry.get("params", {}))
+    return name, params
@@ -1,77 +1,213 @@
 import pandas as pd
-import os
-
-# ===============================
-# PATHS
-# ===============================
-INPUT_DIR = "data/processed"
-OUTPUT_DIR = "data/processed_features"
-
-os.makedirs(OUTPUT_DIR, exist_ok=True)
-
-# ===============================
-# STATE NAME NORMALIZATION
-# ===============================
-STATE_NAME_MAPPING = {
-    "UP": "Uttar Pradesh",
-    "MP": "Madhya Pradesh",
-    "HP": "Himachal Pradesh",
-    "J&K": "Jammu and Kashmir",
-    "DNH": "Dadra and Nagar Haveli",
-    "Pondy": "Puducherry",
-    "WB": "West Bengal",
-    "TN": "Tamil Nadu",
-    "TS": "Telangana",
-    "UK": "Uttarakhand",
-}
+import argparse
+
+from dashboard_summary import update_summary, write_summary
+from feature_state import (
+    DEFAULT_LAGS,
+    DEFAULT_WINDOWS,
+    add_lag_features,
+    default_lags,
+    feature_columns,
+    format_timestamp,
+    infer_freq,
+    period,
+)
+from instrumentation import path_size, run, stage
+from states import normalize_state_name
+from storage import (
+    add_storage_argument,
+    get_storage,
+    read_manifest,
+    write_manifest,
+)
 
 # ===============================
 # FEATURE ENGINEERING FUNCTION
 # ===============================
-def create_features(df):
+def create_features(df, lags=DEFAULT_LAGS, windows=DEFAULT_WINDOWS, freq="D"):
     df = df.copy()
     df.sort_values("date", inplace=True)
 
-    # Lag features
-    df["lag_1"] = df["load"].shift(1)
-    df["lag_7"] = df["load"].shift(7)
+    # Lag, rolling (over past periods only) and calendar features, defined
+    # once in feature_state so the recursive forecaster matches them
+    df = add_lag_features(df, lags, windows, freq=freq)
 
-    # Rolling features
-    df["rolling_mean_7"] = df["load"].rolling(window=7).mean()
+    # Drop rows with NaNs created by lags
+    df.dropna(inplace=True)
+
+    return df
 
-    # Calendar features
-    df["day"] = df["date"].dt.day
-    df["month"] = df["date"].dt.month
-    df["weekday"] = df["date"].dt.weekday
 
-    # Drop rows with NaNs created by lags
+def create_features_long(df, lags=DEFAULT_LAGS, windows=DEFAULT_WINDOWS, freq="D"):
+    # Same features as create_features, for a long (state, date, load)
+    # table of every state in one vectorized pass
+    df = df.sort_values(["state", "date"], kind="stable").reset_index(drop=True)
+
+    df = add_lag_features(df, lags, windows, by="state", freq=freq)
+
     df.dropna(inplace=True)
 
     return df
 
+
 # ===============================
-# PROCESS EACH STATE FILE
+# INCREMENTAL UPDATE
 # ===============================
-for file in os.listdir(INPUT_DIR):
-    if not file.endswith("_data.csv"):
-        continue
+def update_features(storage, state_raw_name, last_date,
+                    lags=DEFAULT_LAGS, windows=DEFAULT_WINDOWS, freq="D"):
+    # Only periods after last_date are new; the lookback tail before it is
+    # what their lags and rolling windows need. Missing periods in the data
+    # mean the tail may span more time, so widen the read if so.
+    lookback = max(tuple(lags) + tuple(windows))
+    last_date = pd.Timestamp(last_date)
 
-    state_raw_name = file.replace("_data.csv", "")
-    state_name = STATE_NAME_MAPPING.get(state_raw_name, state_raw_name)
+    for span in (2 * lookback, 8 * lookback, 32 * lookback):
+        since = last_date - span * period(freq)
+        df = storage.read_state("processed", state_raw_name, since=since)
 
-    file_path = os.path.join(INPUT_DIR, file)
-    df = pd.read_csv(file_path)
+        if (df["date"] <= last_date).sum() >= lookback:
+            feature_df = create_features(df, lags, windows, freq)
+            return feature_df[feature_df["date"] > last_date]
 
-    df["date"] = pd.to_datetime(df["date"])
+    # Too sparse for a tail update; caller rebuilds the full history
+    return None
 
-    feature_df = create_features(df)
 
-    output_path = os.path.join(
-        OUTPUT_DIR, f"{state_name}_features.csv"
+# ===============================
+# PROCESS EACH STATE
+# ===============================
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build lag, rolling and calendar features for every state."
     )
-
-    feature_df.to_csv(output_path, index=False)
-
-    print(f"Processed features for: {state_name}")
-
-print("✅ Feature engineering completed for all states.")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only build feature rows for days after each state's last run. "
+             "Preprocessing still rereads the whole raw file."
+    )
+    parser.add_argument(
+        "--freq",
+        help="Data frequency, e.g. D, h or 15min (default: inferred from the processed data)."
+    )
+    parser.add_argument(
+        "--lags",
+        type=int,
+        nargs="+",
+        help="Lag features to build, in periods (default: "
+             f"{' '.join(map(str, DEFAULT_LAGS))} for daily data, 1, one day "
+             "and one week of periods for intraday data)."
+    )
+    parser.add_argument(
+        "--windows",
+        type=int,
+        nargs="+",
+        help="Rolling-mean windows to build, in periods (default: "
+             f"{' '.join(map(str, DEFAULT_WINDOWS))} for daily data, one day "
+             "and one week of periods for intraday data)."
+    )
+    parser.add_argument(
+        "--chunk-states",
+        type=int,
+        default=0,
+        help="Rebuild this many states at a time to bound memory (0 = all at once)."
+    )
+    add_storage_argument(parser)
+    args = parser.parse_args()
+
+    storage = get_storage(args.storage)
+    processed_states = storage.list_states("processed")
+
+    freq = args.freq
+    if freq is None and processed_states:
+        freq = infer_freq(storage.read_state("processed", processed_states[0])["date"])
+    freq = freq or "D"
+
+    default_lag_set, default_window_set = default_lags(freq)
+    lags = tuple(args.lags or default_lag_set)
+    windows = tuple(args.windows or default_window_set)
+    columns = feature_columns(lags, windows, freq)
+
+    # Last processed date per state, kept next to the feature data. Dates
+    # recorded for a different feature layout cannot be appended to.
+    manifest = read_manifest(storage, "features")
+    if manifest.get("columns") != columns:
+        manifest = {"columns": columns, "last_dates": {}}
+    last_dates = manifest["last_dates"]
+
+    rebuild = []
+
+    for state_raw_name in processed_states:
+        # Older processed data may still use raw abbreviations
+        state_name = normalize_state_name(state_raw_name)
+        last_date = last_dates.get(state_name)
+
+        if args.incremental and last_date and storage.exists("features", state_name):
+            with stage("features.update", state=state_name) as record:
+                new_rows = update_features(
+                    storage, state_raw_name, last_date, lags, windows, freq
+                )
+
+                if new_rows is not None and not new_rows.empty:
+                    path = storage.append_state("features", state_name, new_rows)
+                    last_dates[state_name] = format_timestamp(new_rows["date"].max())
+                    record.rows = len(new_rows)
+                    record.bytes_written = path_size(path)
+                    update_summary(storage, state_name, last_date)
+
+            if new_rows is not None:
+                print(f"Appended {len(new_rows)} feature rows for: {state_name}")
+                continue
+
+        rebuild.append(state_raw_name)
+
+    # ===============================
+    # FULL REBUILD (STATES IN CHUNKS)
+    # ===============================
+    # One vectorized pass per chunk; intraday histories are ~100x longer
+    # than daily ones, so chunking bounds the long table held in memory
+    chunk_size = args.chunk_states or len(rebuild)
+    for start in range(0, len(rebuild), chunk_size or 1):
+        chunk = rebuild[start:start + chunk_size]
+
+        with stage("features.read", storage=storage.name) as record:
+            frames = []
+            for state_raw_name in chunk:
+                df = storage.read_state("processed", state_raw_name)
+                df.insert(0, "state", normalize_state_name(state_raw_name))
+                frames.append(df)
+            long_df = pd.concat(frames, ignore_index=True)
+            record.rows = len(long_df)
+            record.bytes_read = sum(
+                path_size(storage.location("processed", s)) for s in chunk
+            )
+
+        with stage("features.build") as record:
+            feature_df = create_features_long(long_df, lags, windows, freq)
+            record.rows = len(feature_df)
+        del long_df
+
+        with stage("features.write", storage=storage.name) as record:
+            storage.write_all("features", feature_df)
+            record.rows = len(feature_df)
+            record.bytes_written = sum(
+                path_size(storage.location("features", s))
+                for s in feature_df["state"].unique()
+            )
+
+        with stage("features.summaries") as record:
+            for state_name, state_df in feature_df.groupby("state"):
+                write_summary(storage, state_name, state_df.drop(columns="state"))
+            record.rows = feature_df["state"].nunique()
+
+        for state_name, last_date in feature_df.groupby("state")["date"].max().items():
+            last_dates[state_name] = format_timestamp(last_date)
+            print(f"Processed features for: {state_name}")
+
+    write_manifest(storage, "features", manifest)
+
+    print("✅ Feature engineering completed for all states.")
+
+
+if __name__ == "__main__":
+    run(main, "feature_engineering_all_states")
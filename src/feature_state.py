@@ -0,0 +1,230 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+# ===============================
+# FEATURE DEFINITIONS
+# ===============================
+# Shared by training (create_features) and recursive forecasting so both
+# paths compute identical values.
+#
+#   lag_k           load k periods (rows) before the row's time
+#   rolling_mean_w  mean of the w loads before the row's time
+#   day/month/weekday  calendar of the row's date
+#   hour/minute     time of day, for intraday data only
+DEFAULT_LAGS = (1, 7)
+DEFAULT_WINDOWS = (7,)
+CALENDAR_FEATURES = ["day", "month", "weekday"]
+INTRADAY_FEATURES = ["hour", "minute"]
+ALL_CALENDAR_FEATURES = CALENDAR_FEATURES + INTRADAY_FEATURES
+
+_LAG_PATTERN = re.compile(r"^lag_(\d+)$")
+_ROLLING_PATTERN = re.compile(r"^rolling_mean_(\d+)$")
+
+
+# ===============================
+# FREQUENCY
+# ===============================
+# Data is daily unless its timestamps say otherwise; lags and windows
+# count periods (rows) at that frequency.
+def infer_freq(dates):
+    """Most common spacing of the latest timestamps, as a pandas frequency."""
+    recent = pd.Series(pd.to_datetime(dates)).iloc[-1000:]
+    diffs = recent.diff().dropna()
+    diffs = diffs[diffs > pd.Timedelta(0)]
+    step = diffs.mode().iloc[0] if not diffs.empty else pd.Timedelta(days=1)
+    # Gaps of several days are missing data, not a coarser frequency
+    if step >= pd.Timedelta(days=1):
+        return "D"
+    return pd.tseries.frequencies.to_offset(step).freqstr
+
+
+def period(freq):
+    return pd.Timedelta(pd.tseries.frequencies.to_offset(freq).nanos, unit="ns")
+
+
+def periods_per_day(freq):
+    return max(1, int(pd.Timedelta(days=1) // period(freq)))
+
+
+def default_lags(freq="D"):
+    """Previous period, same time yesterday and last week; daily or weekly means."""
+    per_day = periods_per_day(freq)
+    if per_day == 1:
+        return DEFAULT_LAGS, DEFAULT_WINDOWS
+    return (1, per_day, 7 * per_day), (per_day, 7 * per_day)
+
+
+def format_timestamp(timestamp):
+    # Daily data keeps plain dates; intraday data needs the time too
+    timestamp = pd.Timestamp(timestamp)
+    if timestamp == timestamp.normalize():
+        return timestamp.strftime("%Y-%m-%d")
+    return timestamp.strftime("%Y-%m-%dT%H:%M")
+
+
+def calendar_columns(freq="D"):
+    if periods_per_day(freq) == 1:
+        return list(CALENDAR_FEATURES)
+    return list(ALL_CALENDAR_FEATURES)
+
+
+def feature_columns(lags=DEFAULT_LAGS, windows=DEFAULT_WINDOWS, freq="D"):
+    return (
+        [f"lag_{k}" for k in lags]
+        + [f"rolling_mean_{w}" for w in windows]
+        + calendar_columns(freq)
+    )
+
+
+def parse_feature_columns(names):
+    """Recover the lags and rolling windows encoded in feature column names."""
+    lags, windows = [], []
+    for name in names:
+        lag = _LAG_PATTERN.match(name)
+        rolling = _ROLLING_PATTERN.match(name)
+        if lag:
+            lags.append(int(lag.group(1)))
+        elif rolling:
+            windows.append(int(rolling.group(1)))
+    return tuple(lags), tuple(windows)
+
+
+def calendar_features(dates, names=CALENDAR_FEATURES):
+    """Calendar columns ``names`` for a DatetimeIndex or datetime Series."""
+    dt = getattr(dates, "dt", dates)
+    return {name: np.asarray(getattr(dt, name)) for name in names}
+
+
+def add_lag_features(df, lags=DEFAULT_LAGS, windows=DEFAULT_WINDOWS, by=None, freq="D"):
+    """Vectorized lag/rolling columns matching what FeatureState produces.
+
+    With ``by`` set, ``df`` is a long table of several series sorted by
+    ``by`` then date. Shifts and rolling means run once over the whole
+    column and values that would reach into the previous series are masked,
+    so the cost grows with total rows rather than with the number of series.
+    """
+    load = df["load"]
+    if by is None:
+        position = np.arange(len(df))
+    else:
+        position = df.groupby(by, sort=False).cumcount().to_numpy()
+
+    for k in lags:
+        df[f"lag_{k}"] = load.shift(k).where(position >= k)
+
+    previous = load.shift(1)
+    for w in windows:
+        df[f"rolling_mean_{w}"] = previous.rolling(window=w).mean().where(position >= w)
+
+    for name, values in calendar_features(df["date"], calendar_columns(freq)).items():
+        df[name] = values
+
+    return df
+
+
+# ===============================
+# INCREMENTAL STATE
+# ===============================
+class FeatureState:
+    """Circular buffer of the most recent loads with O(1) feature updates.
+
+    Holds exactly ``max(lags + windows)`` values plus one running sum per
+    rolling window, so pushing a new load and reading any lag or rolling
+    mean costs the same regardless of history length.
+    """
+
+    def __init__(self, lags=DEFAULT_LAGS, windows=DEFAULT_WINDOWS):
+        self.lags = tuple(lags)
+        self.windows = tuple(windows)
+        self.size = max(self.lags + self.windows)
+        self.buffer = np.zeros(self.size, dtype=np.float64)
+        self.sums = np.zeros(len(self.windows), dtype=np.float64)
+        self.position = 0
+        self.count = 0
+
+    @classmethod
+    def from_history(cls, loads, lags=DEFAULT_LAGS, windows=DEFAULT_WINDOWS):
+        state = cls(lags, windows)
+        loads = np.asarray(loads, dtype=np.float64)
+        if len(loads) < state.size:
+            raise ValueError(
+                f"Need at least {state.size} past loads, got {len(loads)}"
+            )
+        for load in loads[-state.size:]:
+            state.push(load)
+        return state
+
+    @property
+    def ready(self):
+        return self.count >= self.size
+
+    def push(self, load):
+        for i, w in enumerate(self.windows):
+            if self.count >= w:
+                self.sums[i] -= self.buffer[(self.position - w) % self.size]
+            self.sums[i] += load
+
+        self.buffer[self.position] = load
+        self.position = (self.position + 1) % self.size
+        self.count += 1
+
+    def lag(self, k):
+        return self.buffer[(self.position - k) % self.size]
+
+    def rolling_mean(self, w):
+        return self.sums[self.windows.index(w)] / w
+
+    def values(self):
+        """Lag then rolling-mean values, in feature_columns order."""
+        return [self.lag(k) for k in self.lags] + [
+            total / w for total, w in zip(self.sums, self.windows)
+        ]
+
+
+class BatchFeatureState:
+    """FeatureState for many trajectories advanced in lockstep.
+
+    Every path starts from the same history; ``push`` takes one new load
+    per path and ``values`` returns an (n_paths, n_features) array, so a
+    step of all paths is a handful of vectorized operations.
+    """
+
+    def __init__(self, paths, lags=DEFAULT_LAGS, windows=DEFAULT_WINDOWS):
+        self.paths = paths
+        self.lags = tuple(lags)
+        self.windows = tuple(windows)
+        self.size = max(self.lags + self.windows)
+        self.buffer = np.zeros((paths, self.size), dtype=np.float64)
+        self.sums = np.zeros((paths, len(self.windows)), dtype=np.float64)
+        self.position = 0
+        self.count = 0
+
+    @classmethod
+    def from_history(cls, loads, paths, lags=DEFAULT_LAGS, windows=DEFAULT_WINDOWS):
+        single = FeatureState.from_history(loads, lags, windows)
+        state = cls(paths, lags, windows)
+        state.buffer[:] = single.buffer
+        state.sums[:] = single.sums
+        state.position = single.position
+        state.count = single.count
+        return state
+
+    def push(self, loads):
+        for i, w in enumerate(self.windows):
+            if self.count >= w:
+                self.sums[:, i] -= self.buffer[:, (self.position - w) % self.size]
+            self.sums[:, i] += loads
+
+        self.buffer[:, self.position] = loads
+        self.position = (self.position + 1) % self.size
+        self.count += 1
+
+    def values(self):
+        """Lag then rolling-mean values per path, in feature_columns order."""
+        lag_positions = [(self.position - k) % self.size for k in self.lags]
+        return np.hstack([
+            self.buffer[:, lag_positions],
+            self.sums / np.asarray(self.windows, dtype=np.float64),
+        ])
@@ -0,0 +1,191 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from feature_state import format_timestamp
+from forecasting import DEFAULT_PATHS, DEFAULT_QUANTILES, forecast_intervals, recursive_forecast
+
+
+# ===============================
+# CACHE KEYS
+# ===============================
+def forecast_key(state, last_date, model_hash):
+    """Trajectories are valid for one state, data cutoff and model artifact."""
+    return (state, format_timestamp(last_date), model_hash)
+
+
+def _file_name(key):
+    return hashlib.sha1("|".join(key).encode("utf-8")).hexdigest() + ".npz"
+
+
+# ===============================
+# FORECAST CACHE
+# ===============================
+class ForecastCache:
+    """Two-tier cache of full forecast trajectories.
+
+    Entries are whole trajectories, so any horizon up to the cached length
+    is a prefix lookup and longer horizons only compute the missing periods.
+    The in-memory tier is an LRU bounded by entry count; the optional disk
+    tier (one .npz per key, shareable between app workers) is bounded by
+    total bytes, evicting least recently used files.
+    """
+
+    def __init__(self, max_entries=64, disk_dir=None, max_disk_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    # -------------------------------
+    # Lookup
+    # -------------------------------
+    def get(self, key):
+        """Longest cached trajectory for ``key``, or None."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+        trajectory = self._read_disk(key)
+        if trajectory is not None:
+            self._remember(key, trajectory)
+        return trajectory
+
+    def put(self, key, trajectory):
+        current = self.get(key)
+        if current is not None and len(current) >= len(trajectory):
+            return
+        self._remember(key, trajectory)
+        self._write_disk(key, trajectory)
+
+    def forecast(self, key, model, history, steps, predictor=None, freq=None):
+        """Trajectory for the next ``steps`` periods, reusing cached ones."""
+        cached = self.get(key)
+
+        if cached is not None and len(cached) >= steps:
+            self.hits += 1
+            return cached.iloc[:steps].reset_index(drop=True)
+
+        self.misses += 1
+        if cached is None:
+            trajectory = recursive_forecast(model, history, steps, predictor=predictor, freq=freq)
+        else:
+            # Continue from the cached days as if they were observed loads;
+            # the recursive state only depends on the load sequence
+            extended = pd.concat([
+                history[["date", "load"]],
+                cached.rename(columns={"prediction": "load"})[["date", "load"]],
+            ], ignore_index=True)
+            tail = recursive_forecast(
+                model, extended, steps - len(cached), predictor=predictor, freq=freq
+            )
+            trajectory = pd.concat([cached, tail], ignore_index=True)
+
+        self.put(key, trajectory)
+        return trajectory
+
+    def intervals(self, key, model, history, steps, quantiles=DEFAULT_QUANTILES,
+                  paths=DEFAULT_PATHS, seed=0, predictor=None, freq=None):
+        """forecast_intervals frame for the next ``steps`` periods, reusing cached runs.
+
+        With a fixed seed every run is a prefix of a longer one, so shorter
+        horizons are served from the cached run and longer ones sample
+        again. Entries share the memory tier's LRU; they are not written
+        to disk. Raises TypeError for models without per-tree predictions.
+        """
+        interval_key = key + ("intervals", tuple(quantiles), paths, seed)
+        with self._lock:
+            cached = self._entries.get(interval_key)
+            if cached is not None:
+                self._entries.move_to_end(interval_key)
+
+        if cached is not None and len(cached) >= steps:
+            self.hits += 1
+            return cached.iloc[:steps].reset_index(drop=True)
+
+        self.misses += 1
+        frame = forecast_intervals(
+            model, history, steps, quantiles, paths, seed, predictor=predictor, freq=freq
+        )
+        self._remember(interval_key, frame)
+        return frame
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    # -------------------------------
+    # Memory tier
+    # -------------------------------
+    def _remember(self, key, trajectory):
+        with self._lock:
+            self._entries[key] = trajectory
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    # -------------------------------
+    # Disk tier
+    # -------------------------------
+    def _read_disk(self, key):
+        if not self.disk_dir:
+            return None
+        path = os.path.join(self.disk_dir, _file_name(key))
+        try:
+            with np.load(path) as data:
+                trajectory = pd.DataFrame({
+                    "date": pd.to_datetime(data["date"]),
+                    "prediction": data["prediction"],
+                })
+        except (OSError, ValueError, KeyError):
+            # Missing, or half-written by another worker
+            return None
+        os.utime(path)
+        return trajectory
+
+    def _write_disk(self, key, trajectory):
+        if not self.disk_dir:
+            return
+        path = os.path.join(self.disk_dir, _file_name(key))
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            np.savez(
+                f,
+                date=trajectory["date"].to_numpy(dtype="datetime64[ns]"),
+                prediction=trajectory["prediction"].to_numpy(dtype=np.float64),
+            )
+        # Atomic rename so readers in other processes never see partial files
+        os.replace(temp_path, path)
+        self._evict_disk()
+
+    def _evict_disk(self):
+        entries = []
+        for name in os.listdir(self.disk_dir):
+            if not name.endswith(".npz"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.disk_dir, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.disk_dir, name))
+            except FileNotFoundError:
+                pass
+            total -= size
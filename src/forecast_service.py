@@ -0,0 +1,345 @@
+import argparse
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+
+from dashboard_summary import source_stamp
+from feature_state import format_timestamp, infer_freq, period
+from forecast_cache import ForecastCache, forecast_key
+from forecasting import make_predictor, make_tree_sampler, steps_until
+from instrumentation import COUNTERS, stage
+from model_store import MODEL_DIR, ModelCache, model_exists
+from storage import add_storage_argument, get_storage
+
+
+# Furthest a request may forecast past a state's last reading; each
+# period is one recursive model call
+MAX_HORIZON_DAYS = 366
+
+
+class ForecastError(ValueError):
+    """Invalid forecast request; ``status`` is the HTTP status to report."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+# ===============================
+# FORECASTER
+# ===============================
+class Forecaster:
+    """Models and load histories kept warm for repeated forecasts.
+
+    Safe to share between threads: models live in an LRU ModelCache,
+    each state's history is read from storage again only when its source
+    stamp changes (e.g. after a daily ingest) and trajectories are reused
+    through a ForecastCache.
+    """
+
+    def __init__(
+        self,
+        storage=None,
+        model_dir=MODEL_DIR,
+        max_models=8,
+        cache=None,
+        max_days=MAX_HORIZON_DAYS,
+    ):
+        self.storage = storage or get_storage()
+        self.model_dir = model_dir
+        self.models = ModelCache(max_models=max_models, model_dir=model_dir)
+        self.cache = cache or ForecastCache()
+        self.max_days = max_days
+        # state -> (source stamp, history, freq)
+        self._histories = {}
+        self._lock = threading.Lock()
+
+    def states(self):
+        return [
+            state for state in self.storage.list_states("features")
+            if model_exists(state, self.model_dir)
+        ]
+
+    def _entry(self, state):
+        if not self.storage.exists("features", state):
+            raise ForecastError(f"No data for state '{state}'", status=404)
+        stamp = source_stamp(self.storage, state)
+        with self._lock:
+            entry = self._histories.get(state)
+        if entry is None or entry[0] != stamp:
+            df = self.storage.read_state("features", state)
+            history = df[["date", "load"]].reset_index(drop=True)
+            entry = (stamp, history, infer_freq(history["date"]))
+            with self._lock:
+                self._histories[state] = entry
+        return entry
+
+    def history(self, state):
+        return self._entry(state)[1]
+
+    def freq(self, state):
+        return self._entry(state)[2]
+
+    def trajectory(self, state, steps, intervals=False):
+        """Forecast DataFrame (date, prediction) for the next ``steps`` periods.
+
+        With ``intervals`` the frame also has DEFAULT_QUANTILES columns.
+        Both kinds of run are reused through the ForecastCache.
+        """
+        if not model_exists(state, self.model_dir):
+            raise ForecastError(f"No trained model for state '{state}'", status=404)
+
+        history = self.history(state)
+        with stage("service.model_load", log=False):
+            model, fingerprint = self.models.get(state)
+
+        key = forecast_key(state, history["date"].iloc[-1], fingerprint)
+        if intervals:
+            if make_tree_sampler(model) is None:
+                raise ForecastError(
+                    f"The {type(model).__name__} model for '{state}' has no per-tree "
+                    f"predictions to sample intervals from",
+                    status=422,
+                )
+            with stage("service.intervals", log=False):
+                return self.cache.intervals(
+                    key, model, history, steps,
+                    predictor=make_predictor(model), freq=self.freq(state)
+                )
+        with stage("service.predict", log=False):
+            return self.cache.forecast(
+                key, model, history, steps,
+                predictor=make_predictor(model), freq=self.freq(state)
+            )
+
+    def steps_ahead(self, state, date):
+        last_date = self.history(state)["date"].iloc[-1]
+        freq = self.freq(state)
+        try:
+            target = pd.Timestamp(date)
+        except ValueError:
+            raise ForecastError(f"Invalid date '{date}'")
+        if pd.isna(target):
+            raise ForecastError(f"Invalid date '{date}'")
+        # Stored timestamps carry no timezone, so an offset has nothing to
+        # be converted against
+        if target.tzinfo is not None:
+            raise ForecastError(
+                f"Invalid date '{date}': pass a date or time without a timezone offset"
+            )
+        # Bounds compared as timestamps first: far-off dates would overflow
+        # nanosecond arithmetic
+        if target < last_date.normalize():
+            steps = 0
+        elif target >= last_date.normalize() + pd.Timedelta(days=self.max_days + 1):
+            raise ForecastError(
+                f"Date must be at most {self.max_days} days after the last available "
+                f"date ({format_timestamp(last_date)}) for '{state}'"
+            )
+        elif target == target.normalize():
+            # A bare date asks for the whole day, up to its last period
+            steps = steps_until(last_date, target + pd.Timedelta(days=1) - period(freq), freq)
+        else:
+            steps = steps_until(last_date, target, freq)
+        if steps < 1:
+            raise ForecastError(
+                f"Date must be after the last available date "
+                f"({format_timestamp(last_date)}) for '{state}'"
+            )
+        return steps
+
+    def forecast(self, state, date, include_trajectory=False, intervals=False):
+        steps = self.steps_ahead(state, date)
+        return self._result(state, self.trajectory(state, steps, intervals), include_trajectory)
+
+    def forecast_batch(self, requests, include_trajectory=False, intervals=False):
+        # One recursive run per state, up to its furthest requested date;
+        # every other request for that state is a prefix of it.
+        results = [None] * len(requests)
+        by_state = {}
+
+        for i, request in enumerate(requests):
+            if not isinstance(request, dict):
+                results[i] = {"error": "Each request must be an object with 'state' and 'date'"}
+                continue
+            missing = [field for field in ("state", "date") if field not in request]
+            if missing:
+                results[i] = {"error": f"Missing field '{missing[0]}'"}
+                continue
+            state, date = request["state"], request["date"]
+            if not isinstance(state, str) or not isinstance(date, str):
+                results[i] = {"error": "Fields 'state' and 'date' must be strings"}
+                continue
+            try:
+                steps = self.steps_ahead(state, date)
+            except ForecastError as exc:
+                results[i] = {"error": str(exc)}
+                continue
+            by_state.setdefault(state, []).append((i, steps))
+
+        for state, items in by_state.items():
+            try:
+                trajectory = self.trajectory(
+                    state, max(steps for _, steps in items), intervals
+                )
+            except ForecastError as exc:
+                for i, _ in items:
+                    results[i] = {"error": str(exc)}
+                continue
+            for i, steps in items:
+                results[i] = self._result(state, trajectory.iloc[:steps], include_trajectory)
+
+        return results
+
+    def _result(self, state, trajectory, include_trajectory):
+        last_date = self.history(state)["date"].iloc[-1]
+        date = trajectory["date"].iloc[-1]
+        result = {
+            "state": state,
+            "last_date": format_timestamp(last_date),
+            "date": format_timestamp(date),
+            "days_ahead": (date.normalize() - last_date.normalize()).days,
+            "steps": len(trajectory),
+            "prediction": float(trajectory["prediction"].iloc[-1]),
+        }
+        bands = [column for column in trajectory.columns if column.startswith("q")]
+        if bands:
+            result["interval"] = {
+                column: float(trajectory[column].iloc[-1]) for column in bands
+            }
+        if include_trajectory:
+            result["trajectory"] = [
+                {"date": format_timestamp(row["date"]),
+                 **{column: float(row[column]) for column in ["prediction"] + bands}}
+                for _, row in trajectory.iterrows()
+            ]
+        return result
+
+
+# ===============================
+# HTTP API
+# ===============================
+#   GET  /health
+#   GET  /metrics  (model-load and predict latency counters)
+#   GET  /states
+#   GET  /forecast?state=Bihar&date=2021-01-10[&trajectory=1][&intervals=1]
+#   POST /forecast/batch  {"requests": [{"state": ..., "date": ...}, ...],
+#                          "trajectory": false, "intervals": false}
+class ForecastHandler(BaseHTTPRequestHandler):
+    forecaster = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+
+        if url.path == "/health":
+            self._send(200, {"status": "ok", "models_loaded": len(self.forecaster.models)})
+        elif url.path == "/metrics":
+            self._send(200, {"counters": COUNTERS.snapshot()})
+        elif url.path == "/states":
+            self._send(200, {"states": self.forecaster.states()})
+        elif url.path == "/forecast":
+            if "state" not in query or "date" not in query:
+                self._send(400, {"error": "Query parameters 'state' and 'date' are required"})
+                return
+            self._handle(
+                self.forecaster.forecast,
+                query["state"],
+                query["date"],
+                query.get("trajectory", "0") in ("1", "true"),
+                query.get("intervals", "0") in ("1", "true"),
+            )
+        else:
+            self._send(404, {"error": f"Unknown endpoint {url.path}"})
+
+    def do_POST(self):
+        if urlparse(self.path).path != "/forecast/batch":
+            self._send(404, {"error": f"Unknown endpoint {self.path}"})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            requests = body["requests"]
+        except (ValueError, KeyError, TypeError):
+            requests = None
+        if not isinstance(requests, list):
+            self._send(400, {"error": "Body must be JSON with a 'requests' list"})
+            return
+
+        self._handle(
+            lambda: {"results": self.forecaster.forecast_batch(
+                requests, bool(body.get("trajectory")), bool(body.get("intervals"))
+            )}
+        )
+
+    def _handle(self, func, *args):
+        try:
+            self._send(200, func(*args))
+        except ForecastError as exc:
+            self._send(exc.status, {"error": str(exc)})
+        except Exception as exc:
+            self._send(500, {"error": f"{type(exc).__name__}: {exc}"})
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def make_server(forecaster, host="127.0.0.1", port=8000):
+    handler = type("Handler", (ForecastHandler,), {"forecaster": forecaster})
+    # One thread per request; models and histories are shared via forecaster
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve state load forecasts over HTTP/JSON."
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--max-models",
+        type=int,
+        default=8,
+        help="State models kept loaded at once (least recently used evicted)."
+    )
+    parser.add_argument(
+        "--cache-dir",
+        help="Directory for an on-disk forecast cache shared between processes."
+    )
+    parser.add_argument(
+        "--max-days",
+        type=int,
+        default=MAX_HORIZON_DAYS,
+        help="Furthest forecast allowed past a state's last reading, in days."
+    )
+    add_storage_argument(parser)
+    args = parser.parse_args()
+
+    forecaster = Forecaster(
+        get_storage(args.storage),
+        max_models=args.max_models,
+        cache=ForecastCache(disk_dir=args.cache_dir),
+        max_days=args.max_days,
+    )
+    server = make_server(forecaster, args.host, args.port)
+
+    print(f"⚡ Forecast service listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+import numpy as np
+import pandas as pd
+
+from feature_state import (
+    ALL_CALENDAR_FEATURES,
+    BatchFeatureState,
+    FeatureState,
+    calendar_features,
+    feature_columns,
+    infer_freq,
+    parse_feature_columns,
+    period,
+)
+
+
+# ===============================
+# FEATURE LAYOUT
+# ===============================
+def model_feature_names(model):
+    names = getattr(model, "feature_names_in_", None)
+    if names is None:
+        return feature_columns()
+    return [str(name) for name in names]
+
+
+# ===============================
+# HORIZON
+# ===============================
+def horizon_calendar(history, steps, index, freq=None):
+    """Timestamps of the next ``steps`` periods and their calendar columns.
+
+    The frequency is inferred from ``history`` unless given, so intraday
+    data forecasts intraday periods.
+    """
+    freq = freq or infer_freq(history["date"])
+    last_date = pd.Timestamp(history["date"].iloc[-1])
+    dates = pd.date_range(last_date + period(freq), periods=steps, freq=freq)
+
+    names = [name for name in ALL_CALENDAR_FEATURES if name in index]
+    calendar = calendar_features(dates, names)
+    return dates, [(index[name], calendar[name]) for name in names]
+
+
+def steps_until(last_date, target, freq="D"):
+    """Forecast steps from ``last_date`` up to and including ``target``."""
+    return int((pd.Timestamp(target) - pd.Timestamp(last_date)) // period(freq))
+
+
+# ===============================
+# PREDICTORS
+# ===============================
+def make_predictor(model):
+    """Return a callable mapping a float32 (n, n_features) array to predictions.
+
+    Compiled models from model_store already take arrays. Scikit-learn tree
+    ensembles are evaluated tree by tree on the raw ``tree_`` objects,
+    skipping per-call validation and joblib dispatch. Any other estimator
+    goes through its regular ``predict``.
+    """
+    if getattr(model, "array_input", False):
+        return model.predict
+
+    estimators = getattr(model, "estimators_", None)
+
+    if estimators is not None and all(hasattr(e, "tree_") for e in estimators):
+        trees = [e.tree_ for e in estimators]
+        scale = 1.0 / len(trees)
+
+        def predict(X):
+            total = np.zeros(X.shape[0], dtype=np.float64)
+            for tree in trees:
+                total += tree.predict(X).ravel()
+            return total * scale
+
+        return predict
+
+    names = getattr(model, "feature_names_in_", None)
+
+    def predict(X):
+        if names is not None:
+            X = pd.DataFrame(X, columns=names)
+        return np.asarray(model.predict(X), dtype=np.float64)
+
+    return predict
+
+
+def make_tree_sampler(model):
+    """Return ``(n_trees, predict_each)`` for a tree ensemble, else None.
+
+    ``predict_each(X, trees)`` gives the prediction of tree ``trees[i]``
+    for row ``i`` of a float32 array, one tree per row in a single pass.
+    """
+    if hasattr(model, "predict_each"):
+        return model.n_trees, model.predict_each
+
+    estimators = getattr(model, "estimators_", None)
+    if estimators is None or not all(hasattr(e, "tree_") for e in estimators):
+        return None
+
+    trees = [e.tree_ for e in estimators]
+
+    def predict_each(X, picks):
+        out = np.empty(X.shape[0], dtype=np.float64)
+        for tree in np.unique(picks):
+            rows = picks == tree
+            out[rows] = trees[tree].predict(X[rows]).ravel()
+        return out
+
+    return len(trees), predict_each
+
+
+# ===============================
+# RECURSIVE FORECAST
+# ===============================
+def recursive_forecast(model, history, steps, predictor=None, freq=None):
+    """Forecast ``steps`` periods after the last row of ``history``.
+
+    ``history`` is a date-ordered frame with ``date`` and ``load`` columns
+    holding at least as many periods as the model's longest lag or window.
+    Each prediction is pushed into a FeatureState, so every step sees the
+    same lag/rolling values create_features would have produced. Returns a
+    DataFrame with ``date`` and ``prediction`` columns, one row per period
+    (day, or e.g. 15 minutes for intraday data).
+    """
+    if steps < 1:
+        raise ValueError("steps must be at least 1")
+
+    names = model_feature_names(model)
+    index = {name: i for i, name in enumerate(names)}
+    predict = predictor or make_predictor(model)
+
+    lags, windows = parse_feature_columns(names)
+    state = FeatureState.from_history(history["load"].to_numpy(), lags, windows)
+    state_columns = [index[f"lag_{k}"] for k in lags] + [
+        index[f"rolling_mean_{w}"] for w in windows
+    ]
+
+    # Calendar features for the whole horizon, computed once
+    dates, calendar_columns = horizon_calendar(history, steps, index, freq)
+
+    # Single preallocated, contiguous feature row reused on every step
+    row = np.zeros((1, len(names)), dtype=np.float32)
+    trajectory = np.empty(steps, dtype=np.float64)
+
+    for step in range(steps):
+        row[0, state_columns] = state.values()
+        for column, values in calendar_columns:
+            row[0, column] = values[step]
+
+        prediction = predict(row)[0]
+        trajectory[step] = prediction
+        state.push(prediction)
+
+    return pd.DataFrame({"date": dates, "prediction": trajectory})
+
+
+# ===============================
+# PREDICTION INTERVALS
+# ===============================
+DEFAULT_QUANTILES = (0.05, 0.5, 0.95)
+DEFAULT_PATHS = 100
+
+
+def quantile_column(q):
+    # Percent, so 0.05 -> "q5" and 0.95 -> "q95"
+    return f"q{q * 100:g}"
+
+
+def forecast_intervals(
+    model,
+    history,
+    steps,
+    quantiles=DEFAULT_QUANTILES,
+    paths=DEFAULT_PATHS,
+    seed=0,
+    predictor=None,
+    freq=None,
+):
+    """Forecast with quantiles of sampled trajectories from the tree ensemble.
+
+    All paths advance together. Path 0 follows the ensemble mean and
+    reproduces recursive_forecast. Every other path takes, at each step,
+    the prediction of one randomly drawn tree, so the spread between trees
+    carries through the lags and rolling means into later periods. Each step
+    evaluates the mean row plus one tree per sampled path in a single
+    batch, so the cost grows with ``paths`` and not with the number of
+    trees. Returns recursive_forecast's frame plus one ``q<quantile>``
+    column per quantile.
+    """
+    if steps < 1:
+        raise ValueError("steps must be at least 1")
+
+    sampler = make_tree_sampler(model)
+    if sampler is None:
+        raise TypeError(
+            f"{type(model).__name__} has no per-tree predictions to sample intervals from"
+        )
+    n_trees, predict_each = sampler
+    predict = predictor or make_predictor(model)
+
+    names = model_feature_names(model)
+    index = {name: i for i, name in enumerate(names)}
+
+    lags, windows = parse_feature_columns(names)
+    state = BatchFeatureState.from_history(
+        history["load"].to_numpy(), paths + 1, lags, windows
+    )
+    state_columns = [index[f"lag_{k}"] for k in lags] + [
+        index[f"rolling_mean_{w}"] for w in windows
+    ]
+
+    dates, calendar_columns = horizon_calendar(history, steps, index, freq)
+
+    rng = np.random.default_rng(seed)
+    rows = np.zeros((paths + 1, len(names)), dtype=np.float32)
+    trajectories = np.empty((steps, paths + 1), dtype=np.float64)
+
+    for step in range(steps):
+        rows[:, state_columns] = state.values()
+        for column, values in calendar_columns:
+            rows[:, column] = values[step]
+
+        loads = np.empty(paths + 1, dtype=np.float64)
+        loads[0] = predict(rows[:1])[0]
+        loads[1:] = predict_each(rows[1:], rng.integers(n_trees, size=paths))
+
+        trajectories[step] = loads
+        state.push(loads)
+
+    result = pd.DataFrame({"date": dates, "prediction": trajectories[:, 0]})
+    bands = np.quantile(trajectories[:, 1:], quantiles, axis=1)
+    for q, band in zip(quantiles, bands):
+        result[quantile_column(q)] = band
+    return result
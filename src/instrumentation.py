@@ -0,0 +1,184 @@
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# ===============================
+# CONFIGURATION
+# ===============================
+# JSON-lines log every stage record is appended to
+METRICS_LOG = os.environ.get("PIPELINE_METRICS_LOG", "logs/pipeline_metrics.jsonl")
+
+# "cprofile" or "pyinstrument" to profile whole script runs
+PROFILER = os.environ.get("PIPELINE_PROFILE", "")
+PROFILE_DIR = "logs"
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 ** 2 if sys.platform == "darwin" else 1024), 1)
+
+
+def path_size(path):
+    """Bytes on disk for a file, or for every file under a directory."""
+    if os.path.isdir(path):
+        return sum(
+            os.path.getsize(os.path.join(root, name))
+            for root, _, names in os.walk(path)
+            for name in names
+        )
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+# ===============================
+# LATENCY COUNTERS
+# ===============================
+class Counters:
+    """Thread-safe per-stage call counts and latencies for this process."""
+
+    def __init__(self):
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self._lock:
+            stats = self._stats.setdefault(
+                name, {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0}
+            )
+            stats["count"] += 1
+            stats["total_seconds"] += seconds
+            stats["max_seconds"] = max(stats["max_seconds"], seconds)
+            stats["last_seconds"] = seconds
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                name: dict(stats, mean_seconds=stats["total_seconds"] / stats["count"])
+                for name, stats in self._stats.items()
+            }
+
+
+COUNTERS = Counters()
+
+
+# ===============================
+# STAGE RECORDS
+# ===============================
+class StageRecord(dict):
+    """Fields logged for one stage; set rows/bytes while the stage runs."""
+
+    def __init__(self, name, **fields):
+        super().__init__(stage=name, **fields)
+        self.rows = None
+        self.bytes_read = None
+        self.bytes_written = None
+
+
+def _write(record, log_path):
+    os.makedirs(os.path.dirname(log_path) or ".", exist_ok=True)
+    # One write per line in append mode, so worker processes can share the log
+    with open(log_path, "a") as f:
+        f.write(json.dumps(record, default=str) + "\n")
+
+
+@contextmanager
+def stage(name, log=True, **fields):
+    """Time a block of work and record it.
+
+    Yields a StageRecord whose ``rows``, ``bytes_read`` and
+    ``bytes_written`` can be filled in by the caller. On exit the wall
+    time, peak RSS and any error are added, the latency counters are
+    updated and, unless ``log`` is False, the record is appended to
+    METRICS_LOG.
+    """
+    record = StageRecord(name, **fields)
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield record
+    except BaseException as exc:
+        status = f"error: {type(exc).__name__}"
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        COUNTERS.add(name, seconds)
+
+        record.update(
+            seconds=round(seconds, 6),
+            peak_rss_mb=peak_rss_mb(),
+            status=status,
+            pid=os.getpid(),
+            timestamp=datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        )
+        for key in ("rows", "bytes_read", "bytes_written"):
+            value = getattr(record, key)
+            if value is not None:
+                record[key] = int(value)
+
+        if log:
+            _write(record, METRICS_LOG)
+
+
+# ===============================
+# PROFILING
+# ===============================
+@contextmanager
+def profiled(name, profiler=None):
+    """Profile a block with cProfile or pyinstrument (if installed)."""
+    profiler = profiler if profiler is not None else PROFILER
+
+    if not profiler:
+        yield
+        return
+
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+
+    if profiler == "pyinstrument":
+        from pyinstrument import Profiler
+
+        sampler = Profiler()
+        sampler.start()
+        try:
+            yield
+        finally:
+            sampler.stop()
+            path = os.path.join(PROFILE_DIR, f"{name}.html")
+            with open(path, "w") as f:
+                f.write(sampler.output_html())
+            print(f"🔍 Sampling profile written to {path}")
+        return
+
+    if profiler != "cprofile":
+        raise ValueError(f"Unknown profiler '{profiler}'. Use 'cprofile' or 'pyinstrument'.")
+
+    import cProfile
+    import pstats
+
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield
+    finally:
+        profile.disable()
+        path = os.path.join(PROFILE_DIR, f"{name}.prof")
+        profile.dump_stats(path)
+        print(f"🔍 Profile written to {path}; top functions by cumulative time:")
+        pstats.Stats(profile).sort_stats("cumulative").print_stats(15)
+
+
+def run(main, name):
+    """Run a script's main() as one logged, optionally profiled stage."""
+    with profiled(name), stage(name, argv=sys.argv[1:]):
+        main()
@@ -0,0 +1,596 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+# ===============================
+# PATHS
+# ===============================
+MODEL_DIR = "models"
+
+# Artifact name of the cross-state model built by train_global_model.py
+GLOBAL_MODEL = "_global"
+
+# Which model serves a state: "state" (its own forest), "global" (the
+# cross-state model), or "auto" (its own forest when one exists)
+MODEL_KIND = os.environ.get("LOAD_MODEL_KIND", "auto")
+
+
+def pickle_path(state, model_dir=MODEL_DIR):
+    return os.path.join(model_dir, f"{state}_model.pkl")
+
+
+def forest_dir(state, model_dir=MODEL_DIR):
+    return os.path.join(model_dir, f"{state}_forest")
+
+
+def metadata_path(state, model_dir=MODEL_DIR):
+    return os.path.join(model_dir, f"{state}_model.json")
+
+
+def versions_dir(state, model_dir=MODEL_DIR):
+    return os.path.join(model_dir, "versions", state)
+
+
+def _has_artifact(name, model_dir):
+    return (
+        os.path.isdir(forest_dir(name, model_dir))
+        or os.path.exists(pickle_path(name, model_dir))
+    )
+
+
+def artifact_name(state, model_dir=MODEL_DIR, kind=None):
+    """Name of the artifact serving ``state``: its own or GLOBAL_MODEL."""
+    kind = kind or MODEL_KIND
+    if kind == "state":
+        return state
+    if kind == "global":
+        return GLOBAL_MODEL
+    if kind != "auto":
+        raise ValueError(f"Unknown model kind '{kind}'. Use 'state', 'global' or 'auto'.")
+    return state if _has_artifact(state, model_dir) else GLOBAL_MODEL
+
+
+def model_exists(state, model_dir=MODEL_DIR):
+    name = artifact_name(state, model_dir)
+    if name != GLOBAL_MODEL:
+        return _has_artifact(name, model_dir)
+
+    metadata = read_metadata(GLOBAL_MODEL, model_dir)
+    return (
+        _has_artifact(GLOBAL_MODEL, model_dir)
+        and metadata is not None
+        and state in metadata["states"]
+    )
+
+
+_fingerprints = {}
+
+
+def model_fingerprint(state, model_dir=MODEL_DIR):
+    """Content hash of the artifact load_model would use for ``state``.
+
+    Memoized on file size and modification time, so repeated calls only
+    re-read the files after a retrain.
+    """
+    name = artifact_name(state, model_dir)
+    directory = forest_dir(name, model_dir)
+    if os.path.isdir(directory):
+        paths = [os.path.join(directory, "meta.json"), os.path.join(directory, "nodes.npy")]
+    else:
+        paths = [pickle_path(name, model_dir)]
+    if name == GLOBAL_MODEL:
+        # Holds the per-state scales
+        paths.append(metadata_path(GLOBAL_MODEL, model_dir))
+
+    signature = tuple(
+        (path, os.stat(path).st_size, os.stat(path).st_mtime_ns) for path in paths
+    )
+    if signature not in _fingerprints:
+        digest = hashlib.sha1()
+        for path in paths:
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+        _fingerprints[signature] = digest.hexdigest()[:16]
+    return _fingerprints[signature]
+
+
+# ===============================
+# COMPILED TREE ARTIFACTS
+# ===============================
+NODE_DTYPE = np.dtype([
+    ("feature", np.int32),
+    ("left", np.int32),
+    ("right", np.int32),
+    ("threshold", np.float64),
+    ("value", np.float64),
+])
+
+# Compiled predictions must match the estimator's to this tolerance on
+# the check rows, or only the pickle is kept
+COMPILE_RTOL = 1e-9
+COMPILE_ATOL = 1e-6
+
+
+class FlatTrees:
+    """Regression trees stored as one flat node array.
+
+    All trees share a single structured array with global child indices.
+    Leaves point to themselves with an infinite threshold, so evaluation
+    is a fixed number of vectorized gathers over every (row, tree) pair,
+    and the node file can be memory-mapped instead of unpickled.
+    Subclasses decide how the per-tree values are combined.
+    """
+
+    kind = None
+
+    # Forecasting code passes plain float arrays, no DataFrames
+    array_input = True
+
+    def __init__(self, nodes, roots, feature_names, max_depth, dtype="float32"):
+        self.nodes = nodes
+        self.roots = np.asarray(roots, dtype=np.int32)
+        self.feature_names_in_ = np.asarray(feature_names, dtype=object)
+        self.max_depth = int(max_depth)
+        self.n_trees = len(self.roots)
+        # Input precision the original trees compare thresholds in
+        self.dtype = np.dtype(dtype)
+
+        # Column views into the (possibly memory-mapped) node array
+        self._feature = nodes["feature"]
+        self._threshold = nodes["threshold"]
+        self._value = nodes["value"]
+        # "right" directly follows "left" in NODE_DTYPE, so the pairs are a
+        # zero-copy (n_nodes, 2) view and each step is a single gather
+        left = nodes["left"]
+        self._children = as_strided(
+            left, shape=(len(nodes), 2), strides=(left.strides[0], left.itemsize), writeable=False
+        )
+
+    def _leaf_values(self, X, node):
+        """Values of the leaves reached from ``node``, one row of X per row of node.
+
+        X is flattened so each step gathers features with one index
+        array. Inputs must be finite, as the forecasting features are.
+        """
+        X = np.ascontiguousarray(X, dtype=self.dtype)
+        offsets = np.arange(X.shape[0]) * X.shape[1]
+        if node.ndim == 2:
+            offsets = offsets[:, None]
+        X = X.ravel()
+
+        for _ in range(self.max_depth):
+            right = X[offsets + self._feature[node]] > self._threshold[node]
+            node = self._children[node, right.view(np.int8)]
+        return self._value[node]
+
+    def predict_trees(self, X):
+        """Per-tree values, shape (n_samples, n_trees)."""
+        node = np.broadcast_to(self.roots, (len(X), self.n_trees))
+        return self._leaf_values(X, node)
+
+    def _meta(self):
+        return {
+            "kind": self.kind,
+            "roots": self.roots.tolist(),
+            "feature_names": list(self.feature_names_in_),
+            "max_depth": self.max_depth,
+            "dtype": self.dtype.name,
+        }
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, "nodes.npy"), np.asarray(self.nodes))
+        with open(os.path.join(directory, "meta.json"), "w") as f:
+            json.dump(self._meta(), f)
+
+    @classmethod
+    def _from_meta(cls, nodes, meta):
+        return cls(
+            nodes, meta["roots"], meta["feature_names"], meta["max_depth"],
+            meta.get("dtype", "float32"),
+        )
+
+
+def _feature_names(model):
+    names = getattr(model, "feature_names_in_", None)
+    if names is None:
+        names = [f"x{i}" for i in range(model.n_features_in_)]
+    return [str(name) for name in names]
+
+
+class FlatForest(FlatTrees):
+    """Averaging ensemble compiled from a scikit-learn forest."""
+
+    kind = "forest"
+
+    @classmethod
+    def from_sklearn(cls, model):
+        estimators = getattr(model, "estimators_", None)
+        if estimators is None or not all(hasattr(e, "tree_") for e in estimators):
+            raise TypeError(f"{type(model).__name__} is not a fitted tree ensemble")
+
+        trees = [e.tree_ for e in estimators]
+        if any(tree.n_outputs != 1 for tree in trees):
+            raise TypeError("Only single-output regression forests are supported")
+
+        nodes = np.zeros(sum(tree.node_count for tree in trees), dtype=NODE_DTYPE)
+        roots = []
+        offset = 0
+
+        for tree in trees:
+            count = tree.node_count
+            index = np.arange(offset, offset + count, dtype=np.int32)
+            leaf = tree.children_left == -1
+            block = nodes[offset:offset + count]
+
+            block["feature"] = np.where(leaf, 0, tree.feature)
+            block["left"] = np.where(leaf, index, tree.children_left + offset)
+            block["right"] = np.where(leaf, index, tree.children_right + offset)
+            block["threshold"] = np.where(leaf, np.inf, tree.threshold)
+            block["value"] = tree.value.reshape(count, -1)[:, 0]
+
+            roots.append(offset)
+            offset += count
+
+        max_depth = max(tree.max_depth for tree in trees)
+        return cls(nodes, roots, _feature_names(model), max_depth)
+
+    def predict(self, X):
+        return self.predict_trees(X).mean(axis=1)
+
+    def predict_each(self, X, trees):
+        """Prediction of tree ``trees[i]`` for row ``i``, shape (n_samples,)."""
+        return self._leaf_values(X, self.roots[trees])
+
+
+class FlatBoosting(FlatTrees):
+    """Additive ensemble compiled from HistGradientBoostingRegressor.
+
+    Leaf values already include the learning rate, so a prediction is the
+    baseline plus one leaf value per iteration. The trees are fit on
+    residuals, not resamples, so there is no ``predict_each`` to sample
+    prediction intervals from.
+    """
+
+    kind = "boosting"
+
+    def __init__(self, nodes, roots, feature_names, max_depth, dtype="float64", baseline=0.0):
+        super().__init__(nodes, roots, feature_names, max_depth, dtype)
+        self.baseline = float(baseline)
+
+    @classmethod
+    def from_sklearn(cls, model):
+        predictors = getattr(model, "_predictors", None)
+        if predictors is None or any(len(step) != 1 for step in predictors):
+            raise TypeError(f"{type(model).__name__} is not a fitted single-output booster")
+        if type(model._loss.link).__name__ != "IdentityLink":
+            raise TypeError("Only boosters with an identity link are supported")
+
+        trees = [step[0].nodes for step in predictors]
+        if any(tree["is_categorical"].any() for tree in trees):
+            raise TypeError("Categorical splits are not supported")
+
+        nodes = np.zeros(sum(len(tree) for tree in trees), dtype=NODE_DTYPE)
+        roots = []
+        offset = 0
+
+        for tree in trees:
+            count = len(tree)
+            index = np.arange(offset, offset + count, dtype=np.int32)
+            leaf = tree["is_leaf"].astype(bool)
+            block = nodes[offset:offset + count]
+
+            block["feature"] = np.where(leaf, 0, tree["feature_idx"])
+            block["left"] = np.where(leaf, index, tree["left"].astype(np.int64) + offset)
+            block["right"] = np.where(leaf, index, tree["right"].astype(np.int64) + offset)
+            block["threshold"] = np.where(leaf, np.inf, tree["num_threshold"])
+            block["value"] = tree["value"]
+
+            roots.append(offset)
+            offset += count
+
+        max_depth = max(int(tree["depth"].max()) for tree in trees)
+        baseline = float(np.ravel(model._baseline_prediction)[0])
+        return cls(nodes, roots, _feature_names(model), max_depth, "float64", baseline)
+
+    def predict(self, X):
+        return self.baseline + self.predict_trees(X).sum(axis=1)
+
+    def _meta(self):
+        return dict(super()._meta(), baseline=self.baseline)
+
+    @classmethod
+    def _from_meta(cls, nodes, meta):
+        return cls(
+            nodes, meta["roots"], meta["feature_names"], meta["max_depth"],
+            meta.get("dtype", "float64"), meta["baseline"],
+        )
+
+
+COMPILED_KINDS = {kind.kind: kind for kind in (FlatForest, FlatBoosting)}
+
+
+def compile_model(model):
+    """Compiled copy of a fitted tree ensemble.
+
+    Raises TypeError for estimators no compiled kind supports, e.g.
+    LightGBM or XGBoost models, which are then served from the pickle.
+    """
+    errors = []
+    for kind in COMPILED_KINDS.values():
+        try:
+            return kind.from_sklearn(model)
+        except TypeError as error:
+            errors.append(str(error))
+    raise TypeError("; ".join(errors))
+
+
+def compile_error(model, compiled, X):
+    """Largest absolute difference between the two models' predictions on ``X``."""
+    expected = np.asarray(model.predict(X), dtype=np.float64)
+    actual = compiled.predict(np.asarray(X, dtype=np.float64))
+    tolerance = COMPILE_ATOL + COMPILE_RTOL * np.abs(expected)
+    error = np.abs(actual - expected)
+    return float(error.max(initial=0.0)), bool((error <= tolerance).all())
+
+
+def load_compiled(directory, mmap=True):
+    with open(os.path.join(directory, "meta.json")) as f:
+        meta = json.load(f)
+    nodes = np.load(
+        os.path.join(directory, "nodes.npy"), mmap_mode="r" if mmap else None
+    )
+    # Artifacts written before boosting support are all forests
+    return COMPILED_KINDS[meta.get("kind", "forest")]._from_meta(nodes, meta)
+
+
+# ===============================
+# GLOBAL MODEL ADAPTER
+# ===============================
+def global_inputs(X, load_columns, code, scale):
+    """One state's feature rows as inputs to the global model.
+
+    Load-valued columns are divided by the state's scale and the state's
+    code is appended as a last column.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    inputs = np.empty((X.shape[0], X.shape[1] + 1))
+    inputs[:, :-1] = X
+    inputs[:, load_columns] /= scale
+    inputs[:, -1] = code
+    return inputs
+
+
+class GlobalStateModel:
+    """One state's view of the global model.
+
+    Takes the same feature rows as a per-state model and returns loads in
+    the state's own units, so forecasting code cannot tell the two apart.
+    """
+
+    array_input = True
+
+    def __init__(self, forest, feature_names, load_columns, code, scale):
+        self.forest = forest
+        self.feature_names_in_ = np.asarray(feature_names, dtype=object)
+        self.load_columns = list(load_columns)
+        self.code = code
+        self.scale = scale
+
+    def _inputs(self, X):
+        return global_inputs(X, self.load_columns, self.code, self.scale)
+
+    @property
+    def n_trees(self):
+        return self.forest.n_trees
+
+    def predict_trees(self, X):
+        return self.forest.predict_trees(self._inputs(X)) * self.scale
+
+    def predict_each(self, X, trees):
+        return self.forest.predict_each(self._inputs(X), trees) * self.scale
+
+    def predict(self, X):
+        return np.asarray(self.forest.predict(self._inputs(X))) * self.scale
+
+
+# ===============================
+# SAVE / LOAD
+# ===============================
+def save_model(model, state, model_dir=MODEL_DIR, check=None):
+    import joblib
+
+    os.makedirs(model_dir, exist_ok=True)
+    # Dumped beside and swapped in, so the hard links archive_model keeps
+    # to the previous pickle are never rewritten
+    path = pickle_path(state, model_dir)
+    temp_path = f"{path}.tmp"
+    joblib.dump(model, temp_path)
+    os.replace(temp_path, path)
+    export_compiled(model, state, model_dir, check)
+    return path
+
+
+def export_compiled(model, state, model_dir=MODEL_DIR, check=None):
+    """Write the compiled copy of ``model`` that load_model serves.
+
+    With ``check`` rows, the compiled predictions are compared to the
+    estimator's first and nothing is written when they differ. Returns
+    ``(kind, max_error)``, or None when only the pickle can serve.
+    """
+    # A stale copy from an earlier model would shadow the new pickle
+    directory = forest_dir(state, model_dir)
+    shutil.rmtree(directory, ignore_errors=True)
+    try:
+        compiled = compile_model(model)
+    except TypeError:
+        return None
+
+    max_error = None
+    if check is not None and len(check):
+        max_error, matches = compile_error(model, compiled, check)
+        if not matches:
+            print(f"⚠️ Compiled {state} model differs by {max_error:.3g}; serving the pickle")
+            return None
+
+    compiled.save(directory)
+    return compiled.kind, max_error
+
+
+def load_estimator(state, model_dir=MODEL_DIR):
+    """The scikit-learn model itself, e.g. to continue training it."""
+    import joblib
+
+    return joblib.load(pickle_path(state, model_dir))
+
+
+def read_metadata(state, model_dir=MODEL_DIR):
+    """Training metadata saved next to a state's model, or None."""
+    try:
+        with open(metadata_path(state, model_dir)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def write_metadata(state, metadata, model_dir=MODEL_DIR):
+    path = metadata_path(state, model_dir)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(metadata, f, indent=2, default=str)
+    os.replace(temp_path, path)
+
+
+def _link_or_copy(source, target):
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+def archive_model(state, version, model_dir=MODEL_DIR, keep=5):
+    """Hard-link the live artifacts into ``versions/<state>/v<version>/``.
+
+    Saves always write new files, so an archived version shares disk with
+    the live model until the next save replaces it and costs nothing extra
+    on a fresh retrain. Only the newest ``keep`` versions are kept; a bad
+    update is rolled back by deleting the live artifacts and copying a
+    version directory back into ``model_dir``.
+    """
+    root = versions_dir(state, model_dir)
+    target = os.path.join(root, f"v{version:04d}")
+    shutil.rmtree(target, ignore_errors=True)
+    os.makedirs(target)
+
+    for path in (pickle_path(state, model_dir), metadata_path(state, model_dir)):
+        if os.path.exists(path):
+            _link_or_copy(path, os.path.join(target, os.path.basename(path)))
+    directory = forest_dir(state, model_dir)
+    if os.path.isdir(directory):
+        shutil.copytree(
+            directory,
+            os.path.join(target, os.path.basename(directory)),
+            copy_function=_link_or_copy,
+        )
+
+    for old in sorted(os.listdir(root))[:-keep]:
+        shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+    return target
+
+
+def load_model(state, model_dir=MODEL_DIR, mmap=True):
+    name = artifact_name(state, model_dir)
+    if name == GLOBAL_MODEL:
+        return load_global(state, model_dir, mmap=mmap)
+    return _load_artifact(name, model_dir, mmap)
+
+
+def load_global(state, model_dir=MODEL_DIR, mmap=True):
+    metadata = read_metadata(GLOBAL_MODEL, model_dir)
+    if metadata is None or state not in metadata["states"]:
+        raise FileNotFoundError(f"No model for '{state}' in {model_dir}")
+
+    entry = metadata["states"][state]
+    return GlobalStateModel(
+        _load_artifact(GLOBAL_MODEL, model_dir, mmap),
+        metadata["feature_names"],
+        metadata["load_columns"],
+        entry["code"],
+        entry["scale"],
+    )
+
+
+def _load_artifact(name, model_dir, mmap):
+    directory = forest_dir(name, model_dir)
+    if os.path.isdir(directory):
+        try:
+            return load_compiled(directory, mmap=mmap)
+        except (OSError, KeyError, ValueError):
+            # Unreadable or unknown layout: fall back to the pickle
+            if not os.path.exists(pickle_path(name, model_dir)):
+                raise
+
+    import joblib
+
+    return joblib.load(pickle_path(name, model_dir))
+
+
+# ===============================
+# LRU MODEL CACHE
+# ===============================
+class ModelCache:
+    """Thread-safe LRU cache bounding how many state models stay loaded."""
+
+    def __init__(self, max_models=8, model_dir=MODEL_DIR):
+        self.max_models = max_models
+        self.model_dir = model_dir
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, state):
+        """``(model, fingerprint)`` for ``state``, reloaded after a retrain.
+
+        The fingerprint is the one of the artifact the model was loaded
+        from, so forecast cache keys built from it always describe the
+        model that computed the forecast.
+        """
+        fingerprint = model_fingerprint(state, self.model_dir)
+        with self._lock:
+            entry = self._models.get(state)
+            if entry is not None and entry[1] == fingerprint:
+                self._models.move_to_end(state)
+                return entry
+
+        # Load outside the lock so other states are not held up; load again
+        # if the artifact was replaced while it was being read
+        while True:
+            model = load_model(state, self.model_dir)
+            loaded = model_fingerprint(state, self.model_dir)
+            if loaded == fingerprint:
+                break
+            fingerprint = loaded
+
+        entry = (model, fingerprint)
+        with self._lock:
+            self._models[state] = entry
+            self._models.move_to_end(state)
+            while len(self._models) > self.max_models:
+                self._models.popitem(last=False)
+        return entry
+
+    def __contains__(self, state):
+        return state in self._models
+
+    def __len__(self):
+        return len(self._models)
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
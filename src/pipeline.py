@@ -0,0 +1,391 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import pandas as pd
+
+from dashboard_summary import write_summary
+from estimators import ENGINES, PRESETS_PATH, load_presets, resolve_preset
+from feature_engineering_all_states import create_features
+from feature_state import (
+    DEFAULT_LAGS,
+    DEFAULT_WINDOWS,
+    default_lags,
+    feature_columns,
+    format_timestamp,
+    infer_freq,
+)
+from instrumentation import path_size, run, stage
+from model_store import pickle_path
+from preprocess_all_states import RAW_DATA_PATH, clean_long
+from states import normalize_state_name
+from storage import add_storage_argument, get_storage, read_manifest, write_manifest
+from train_models_all_states import RESULTS_PATH, split_cores, train_state
+
+# ===============================
+# PATHS
+# ===============================
+# Input hash of every (stage, state) artifact built so far
+STATE_PATH = ".cache/pipeline_state.json"
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+# ===============================
+# HASHING
+# ===============================
+def artifact_digest(path):
+    """Content hash of a file, or of every file under a directory."""
+    digest = hashlib.sha1()
+    if os.path.isdir(path):
+        for root, dirs, names in os.walk(path):
+            dirs.sort()
+            for name in sorted(names):
+                full = os.path.join(root, name)
+                digest.update(os.path.relpath(full, path).encode("utf-8"))
+                with open(full, "rb") as f:
+                    digest.update(f.read())
+    else:
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def code_digest(modules):
+    return hashlib.sha1(b"".join(
+        open(os.path.join(SRC_DIR, f"{module}.py"), "rb").read() for module in modules
+    )).hexdigest()
+
+
+def input_key(*parts):
+    return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+# ===============================
+# STAGES
+# ===============================
+# Each stage builds one state's artifact from the upstream stage's
+# artifact. Its input key covers that upstream content, the options it
+# uses and the source of the modules that define it, so any of them
+# changing rebuilds the state, and an unchanged rebuild upstream (same
+# bytes) still lets it skip.
+def processed_key(state, storage, options, raw):
+    return input_key(
+        hashlib.sha1(pd.util.hash_pandas_object(raw, index=False).to_numpy().tobytes()).hexdigest(),
+        list(raw.columns),
+        options["fill"],
+        options["freq"],
+        code_digest(["preprocess_all_states", "states"]),
+    )
+
+
+def build_processed(state, storage, options, raw):
+    long_df = clean_long(raw, fill=options["fill"], freq=options["freq"])
+    if long_df.empty:
+        return {"rows": 0}
+    path = storage.write_state("processed", state, long_df.drop(columns="state"))
+    return {"rows": len(long_df), "bytes_written": path_size(path)}
+
+
+def features_key(state, storage, options, raw):
+    return input_key(
+        artifact_digest(storage.location("processed", state)),
+        options["lags"],
+        options["windows"],
+        code_digest(["feature_engineering_all_states", "feature_state", "dashboard_summary"]),
+    )
+
+
+def feature_layout(df, options):
+    # Lags and windows count periods, so their defaults follow the data
+    freq = infer_freq(df["date"])
+    default_lag_set, default_window_set = default_lags(freq)
+    return (
+        options["lags"] or default_lag_set,
+        options["windows"] or default_window_set,
+        freq,
+    )
+
+
+def build_features(state, storage, options, raw):
+    df = storage.read_state("processed", state)
+    lags, windows, freq = feature_layout(df, options)
+    feature_df = create_features(df, lags, windows, freq)
+    path = storage.write_state("features", state, feature_df)
+    write_summary(storage, state, feature_df)
+    return {
+        "rows": len(feature_df),
+        "bytes_written": path_size(path),
+        "last_date": format_timestamp(feature_df["date"].max()),
+        "columns": feature_columns(lags, windows, freq),
+    }
+
+
+def model_key(state, storage, options, raw):
+    engine, params = resolve_preset(state, options["presets"], options["engine"])
+    return input_key(
+        artifact_digest(storage.location("features", state)),
+        engine,
+        params,
+        options["validation_fraction"],
+        code_digest(["train_models_all_states", "estimators", "model_store"]),
+    )
+
+
+def build_model(state, storage, options, raw):
+    result = train_state(
+        state,
+        storage,
+        options["n_jobs"],
+        options["engine"],
+        options["presets"],
+        options["validation_fraction"],
+    )
+    return {"result": result}
+
+
+STAGES = {
+    "processed": {
+        "key": processed_key,
+        "build": build_processed,
+        "exists": lambda state, storage: storage.exists("processed", state),
+        "next": "features",
+    },
+    "features": {
+        "key": features_key,
+        "build": build_features,
+        "exists": lambda state, storage: storage.exists("features", state),
+        "next": "model",
+    },
+    "model": {
+        "key": model_key,
+        "build": build_model,
+        "exists": lambda state, storage: os.path.exists(pickle_path(state)),
+        "next": None,
+    },
+}
+STAGE_ORDER = list(STAGES)
+
+
+def run_task(name, state, storage, options, previous_key, raw=None, force=False):
+    """Build one (stage, state) artifact unless its inputs are unchanged."""
+    spec = STAGES[name]
+    start = time.perf_counter()
+
+    with stage(f"pipeline.{name}", state=state) as record:
+        key = spec["key"](state, storage, options, raw)
+        if not force and key == previous_key and spec["exists"](state, storage):
+            record["skipped"] = True
+            return name, state, key, "skipped", {}, time.perf_counter() - start
+
+        info = spec["build"](state, storage, options, raw)
+        record.rows = info.get("rows")
+        record.bytes_written = info.get("bytes_written")
+
+    status = "empty" if info.get("rows") == 0 else "built"
+    return name, state, key, status, info, time.perf_counter() - start
+
+
+# ===============================
+# PIPELINE STATE
+# ===============================
+def read_state_file(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_state_file(path, keys):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(keys, f, indent=2, sort_keys=True)
+    os.replace(temp_path, path)
+
+
+# ===============================
+# RAW INPUT
+# ===============================
+def raw_by_state(path=RAW_DATA_PATH):
+    """Wide raw columns grouped by normalized state name, with the date."""
+    with stage("pipeline.read_raw") as record:
+        df = pd.read_csv(path)
+        if df.columns[0] != "date":
+            df = df.rename(columns={df.columns[0]: "date"})
+        df["date"] = pd.to_datetime(df["date"], dayfirst=True)
+        record.rows = len(df)
+        record.bytes_read = path_size(path)
+
+    groups = {}
+    for column in df.columns[1:]:
+        groups.setdefault(normalize_state_name(column), []).append(column)
+    return {state: df[["date"] + columns] for state, columns in groups.items()}
+
+
+# ===============================
+# RUN THE DAG
+# ===============================
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run preprocessing, feature engineering and training as one "
+                    "dependency-aware pipeline, rebuilding only changed states."
+    )
+    parser.add_argument("--states", nargs="+", help="Only run these states.")
+    parser.add_argument(
+        "--until",
+        choices=STAGE_ORDER,
+        default=STAGE_ORDER[-1],
+        help="Last stage to run (default: %(default)s)."
+    )
+    parser.add_argument("--force", action="store_true", help="Rebuild even if inputs are unchanged.")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Parallel state tasks (0 = one per CPU core, 1 = no pool)."
+    )
+    parser.add_argument("--raw", default=RAW_DATA_PATH)
+    parser.add_argument("--fill", choices=["drop", "ffill"], default="drop")
+    parser.add_argument("--freq", help="Resample raw loads to this period, e.g. h or 15min.")
+    parser.add_argument(
+        "--lags",
+        type=int,
+        nargs="+",
+        help=f"Lags in periods (default: {' '.join(map(str, DEFAULT_LAGS))} for daily data, "
+             "a day and a week of periods for intraday data)."
+    )
+    parser.add_argument(
+        "--windows",
+        type=int,
+        nargs="+",
+        help=f"Rolling windows in periods (default: {' '.join(map(str, DEFAULT_WINDOWS))} "
+             "for daily data, a day and a week of periods for intraday data)."
+    )
+    parser.add_argument("--engine", choices=list(ENGINES))
+    parser.add_argument("--presets", default=PRESETS_PATH)
+    parser.add_argument("--validation-fraction", type=float, default=0.1)
+    parser.add_argument("--state-file", default=STATE_PATH)
+    add_storage_argument(parser)
+    args = parser.parse_args()
+
+    storage = get_storage(args.storage)
+    raw = raw_by_state(args.raw)
+
+    # States come from the raw file, plus any already processed by other
+    # means (e.g. the single-state preprocess.py output)
+    states = sorted(set(raw) | set(storage.list_states("processed")))
+    if args.states:
+        states = [state for state in states if state in args.states]
+    if not states:
+        parser.error("No states to run")
+
+    workers, tree_jobs = split_cores(args.workers, len(states))
+    options = {
+        "fill": args.fill,
+        "freq": args.freq,
+        "lags": tuple(args.lags or ()),
+        "windows": tuple(args.windows or ()),
+        "engine": args.engine,
+        "presets": load_presets(args.presets),
+        "validation_fraction": args.validation_fraction,
+        "n_jobs": tree_jobs if workers > 1 else -1,
+    }
+    last_stage = STAGE_ORDER.index(args.until)
+
+    keys = read_state_file(args.state_file)
+    counts = {"built": 0, "skipped": 0, "empty": 0}
+    feature_dates = {}
+    feature_layouts = set()
+    trained = []
+
+    def first_task(state):
+        name = "processed" if state in raw else "features"
+        return name, state
+
+    def task_args(name, state):
+        return (
+            name,
+            state,
+            storage,
+            options,
+            keys.get(f"{name}/{state}"),
+            raw.get(state) if name == "processed" else None,
+            args.force,
+        )
+
+    def finish(outcome):
+        # Record the result and return the downstream task, if any
+        name, state, key, status, info, seconds = outcome
+        counts[status] += 1
+        if status == "empty":
+            print(f"⚠️ {name:<9} {state}: no rows")
+            return None
+
+        keys[f"{name}/{state}"] = key
+        write_state_file(args.state_file, keys)
+        print(f"{'✅' if status == 'built' else '⏭️'} {name:<9} {state} ({status}, {seconds:.2f}s)")
+
+        if "last_date" in info:
+            feature_dates[state] = info["last_date"]
+            feature_layouts.add(tuple(info["columns"]))
+        if "result" in info:
+            trained.append(info["result"])
+
+        following = STAGES[name]["next"]
+        if following is None or STAGE_ORDER.index(following) > last_stage:
+            return None
+        return following, state
+
+    print(f"Running {len(states)} states up to '{args.until}' on {workers} workers.")
+    pending = [first_task(state) for state in states]
+
+    if workers == 1:
+        while pending:
+            task = finish(run_task(*task_args(*pending.pop(0))))
+            if task:
+                pending.append(task)
+    else:
+        # Any state's next stage starts as soon as its previous one ends,
+        # independently of the other states
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            running = {executor.submit(run_task, *task_args(*task)) for task in pending}
+            while running:
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = finish(future.result())
+                    if task:
+                        running.add(executor.submit(run_task, *task_args(*task)))
+
+    # ===============================
+    # KEEP STAGE SCRIPTS IN SYNC
+    # ===============================
+    # Feature dates let feature_engineering_all_states.py --incremental
+    # carry on from here
+    if len(feature_layouts) == 1:
+        manifest = read_manifest(storage, "features")
+        columns = list(feature_layouts.pop())
+        if manifest.get("columns") != columns:
+            manifest = {"columns": columns, "last_dates": {}}
+        manifest["last_dates"].update(feature_dates)
+        write_manifest(storage, "features", manifest)
+
+    if trained:
+        results_df = pd.DataFrame(trained)
+        if os.path.exists(RESULTS_PATH):
+            previous = pd.read_csv(RESULTS_PATH)
+            results_df = pd.concat([
+                previous[~previous["State"].isin(results_df["State"])], results_df
+            ], ignore_index=True)
+        os.makedirs(os.path.dirname(RESULTS_PATH), exist_ok=True)
+        results_df.sort_values("State").reset_index(drop=True).to_csv(RESULTS_PATH, index=False)
+
+    print(f"🎯 Pipeline finished: {counts['built']} built, {counts['skipped']} skipped"
+          + (f", {counts['empty']} empty" if counts["empty"] else "") + ".")
+
+
+if __name__ == "__main__":
+    run(main, "pipeline")
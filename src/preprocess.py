@@ -1,5 +1,7 @@
 import pandas as pd
 
+from preprocess_all_states import RAW_DATA_PATH, RAW_DATE_FORMAT
+
 # ==============================
 # PROJECT CONFIGURATION
 # ==============================
@@ -8,29 +10,30 @@ SELECTED_STATE = "Bihar"
 # ==============================
 # LOAD RAW DATA
 # ==============================
-df = pd.read_csv("data/raw/electricity_load.csv")
+columns = pd.read_csv(RAW_DATA_PATH, nrows=0).columns.tolist()
 
 print("Original columns:")
-print(df.columns.tolist())
+print(columns)
 
-# ==============================
-# FIX DATE COLUMN (Unnamed: 0)
-# ==============================
-if "Unnamed: 0" not in df.columns:
+if "Unnamed: 0" not in columns:
     raise ValueError("Expected 'Unnamed: 0' column not found")
 
-df = df.rename(columns={"Unnamed: 0": "date"})
-df["date"] = pd.to_datetime(df["date"], dayfirst=True, errors="coerce")
+if SELECTED_STATE not in columns:
+    raise ValueError(f"State '{SELECTED_STATE}' not found in dataset")
 
+# Only the date and the selected state's column are parsed; loads stay
+# text so to_numeric below turns stray tokens into missing values
+df = pd.read_csv(
+    RAW_DATA_PATH,
+    usecols=["Unnamed: 0", SELECTED_STATE],
+    dtype="str",
+)
 
 # ==============================
-# EXTRACT SELECTED STATE
+# FIX DATE COLUMN (Unnamed: 0)
 # ==============================
-if SELECTED_STATE not in df.columns:
-    raise ValueError(f"State '{SELECTED_STATE}' not found in dataset")
-
-df = df[["date", SELECTED_STATE]]
-df = df.rename(columns={SELECTED_STATE: "load"})
+df = df.rename(columns={"Unnamed: 0": "date", SELECTED_STATE: "load"})
+df["date"] = pd.to_datetime(df["date"], format=RAW_DATE_FORMAT, errors="coerce")
 
 # ==============================
 # SORT & CLEAN DATA
@@ -38,7 +41,7 @@ df = df.rename(columns={SELECTED_STATE: "load"})
 df = df.sort_values("date").reset_index(drop=True)
 
 df["load"] = pd.to_numeric(df["load"], errors="coerce")
-df["load"] = df["load"].fillna(method="ffill")
+df["load"] = df["load"].ffill()
 
 df = df.drop_duplicates(subset="date")
 
@@ -1,51 +1,231 @@
 import pandas as pd
-import os
+import argparse
+
+from instrumentation import path_size, run, stage
+from states import STATE_NAME_MAPPING
+from storage import add_storage_argument, get_storage
 
 # ===============================
 # PATHS
 # ===============================
 RAW_DATA_PATH = "data/raw/electricity_load.csv"
-OUTPUT_DIR = "data/processed"
 
-# Create output directory if not exists
-os.makedirs(OUTPUT_DIR, exist_ok=True)
+# Raw exports write timestamps day first; a fixed format parses each
+# chunk without guessing
+RAW_DATE_FORMAT = "%d/%m/%Y %H:%M:%S"
+
+# Raw rows per chunk in --stream mode
+CHUNK_ROWS = 20_000
+
 
 # ===============================
-# LOAD RAW DATA
+# WIDE -> LONG CLEANING
 # ===============================
-df = pd.read_csv(RAW_DATA_PATH)
+def clean_long(df, fill="drop", freq=None, carry=None):
+    """Clean a wide date x state table for all states at once.
 
-# Rename first column to date if needed
-if df.columns[0] != "date":
-    df.rename(columns={df.columns[0]: "date"}, inplace=True)
+    Returns a long (state, date, load) table sorted by state then date,
+    with normalized state names, numeric loads, one row per state and
+    date, and missing loads dropped or forward-filled within each state.
+    With ``freq`` (e.g. "h" for 15-minute readings), each state's loads
+    are first averaged into regular periods of that length. ``carry``
+    maps states to the last load of the previous chunk, so forward fills
+    continue across chunks; it is updated in place.
+    """
+    long_df = df.melt(id_vars="date", var_name="state", value_name="load")
 
-# Convert date column
-df["date"] = pd.to_datetime(df["date"], dayfirst=True)
+    long_df["state"] = long_df["state"].replace(STATE_NAME_MAPPING)
+    long_df["load"] = pd.to_numeric(long_df["load"], errors="coerce")
 
-# ===============================
-# IDENTIFY STATE COLUMNS
-# ===============================
-state_columns = [col for col in df.columns if col != "date"]
+    # One stable sort keeps the raw file order among duplicate dates
+    long_df = long_df.sort_values(["state", "date"], kind="stable")
+    long_df = long_df.drop_duplicates(subset=["state", "date"])
+
+    if freq:
+        long_df = (
+            long_df.dropna(subset=["date"])
+            .set_index("date")
+            .groupby("state", sort=False)["load"]
+            .resample(freq)
+            .mean()
+            .reset_index()
+        )
+
+    if fill == "ffill":
+        long_df["load"] = long_df.groupby("state", sort=False)["load"].ffill()
+        if carry:
+            long_df["load"] = long_df["load"].fillna(long_df["state"].map(carry))
+
+    # Leading gaps cannot be forward-filled either
+    long_df = long_df.dropna(subset=["date", "load"])
+
+    if carry is not None:
+        carry.update(long_df.groupby("state", sort=False)["load"].last())
+
+    return long_df[["state", "date", "load"]].reset_index(drop=True)
 
-print(f"Found {len(state_columns)} states.")
 
 # ===============================
-# PROCESS EACH STATE
+# STREAMING INGESTION
 # ===============================
-for state in state_columns:
-    state_df = df[["date", state]].copy()
-    state_df.rename(columns={state: "load"}, inplace=True)
+def stream_clean(storage, path=RAW_DATA_PATH, chunksize=CHUNK_ROWS, fill="drop",
+                 freq=None, date_format=RAW_DATE_FORMAT):
+    """Clean the raw file chunk by chunk, appending rows to each state's table.
+
+    Peak memory is one chunk of the raw file whatever its length. Exports
+    in time order give the same tables as clean_long on the whole file.
+    Out-of-order files, and every file when resampling to ``freq``, are
+    finished with a second pass over each state's own table, one state
+    at a time. Returns the number of rows written per state.
+    """
+    columns = pd.read_csv(path, nrows=0).columns
+    # Loads stay text until clean_long coerces them, so stray tokens such
+    # as "--" become missing loads as in the whole-file path
+    dtype = {column: "str" for column in columns}
+
+    written = {}
+    carry = {}
+    last_date = None
+    reordered = False
+
+    # Resampling averages raw readings, so missing ones are dropped here
+    # and only whole missing periods are filled in the second pass
+    stream_fill = "drop" if freq else fill
+
+    for chunk in pd.read_csv(path, dtype=dtype, chunksize=chunksize):
+        with stage("preprocess.chunk") as record:
+            chunk = chunk.rename(columns={columns[0]: "date"})
+            raw_dates = chunk["date"]
+            chunk["date"] = pd.to_datetime(raw_dates, format=date_format, errors="coerce")
+            if raw_dates.notna().any() and chunk["date"].isna().all():
+                raise ValueError(
+                    f"No timestamps in a chunk of {path} match the date format "
+                    f"'{date_format}' (first value: '{raw_dates.dropna().iloc[0]}'); "
+                    f"pass --date-format"
+                )
+
+            if last_date is not None:
+                # A timestamp repeated across the chunk boundary keeps its
+                # first reading, as drop_duplicates does in clean_long
+                chunk = chunk[chunk["date"] != last_date]
+                reordered = reordered or bool((chunk["date"] < last_date).any())
+            if chunk["date"].notna().any():
+                chunk_last = chunk["date"].max()
+                last_date = chunk_last if last_date is None else max(last_date, chunk_last)
+
+            long_df = clean_long(chunk, fill=stream_fill, carry=carry)
+            for state, state_df in long_df.groupby("state", sort=False):
+                state_df = state_df.drop(columns="state")
+                if state in written:
+                    storage.append_state("processed", state, state_df)
+                else:
+                    storage.write_state("processed", state, state_df)
+                    written[state] = 0
+                written[state] += len(state_df)
+            record.rows = len(chunk)
+
+    if freq or reordered:
+        for state in sorted(written):
+            with stage("preprocess.finish", state=state) as record:
+                # Same cleaning as the whole-file path, over this state only
+                df = storage.read_state("processed", state).rename(columns={"load": state})
+                state_df = clean_long(df, fill=fill, freq=freq).drop(columns="state")
+                storage.write_state("processed", state, state_df)
+                written[state] = len(state_df)
+                record.rows = len(state_df)
+
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Split the raw wide load file into per-state tables."
+    )
+    parser.add_argument(
+        "--fill",
+        choices=["drop", "ffill"],
+        default="drop",
+        help="Drop days with missing load, or carry the last load forward."
+    )
+    parser.add_argument(
+        "--freq",
+        help="Average loads into periods of this length, e.g. h or 15min "
+             "for intraday readings (default: keep the raw timestamps)."
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Read the raw file in chunks and write each state's rows as they "
+             "are cleaned, keeping memory flat for very large exports."
+    )
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        default=CHUNK_ROWS,
+        help="Raw rows per chunk with --stream (default: %(default)s)."
+    )
+    parser.add_argument(
+        "--date-format",
+        default=RAW_DATE_FORMAT,
+        help="Raw timestamp format with --stream (default: %(default)s)."
+    )
+    add_storage_argument(parser)
+    args = parser.parse_args()
+
+    storage = get_storage(args.storage)
+
+    if args.stream:
+        with stage("preprocess.stream", storage=storage.name) as record:
+            written = stream_clean(
+                storage, RAW_DATA_PATH, args.chunksize, args.fill, args.freq, args.date_format
+            )
+            record.rows = sum(written.values())
+            record.bytes_read = path_size(RAW_DATA_PATH)
+
+        print(f"Saved {len(written)} states ({sum(written.values())} rows) to {storage.name} storage.")
+        print("✅ Preprocessing completed for all states.")
+        return
+
+    # ===============================
+    # LOAD RAW DATA
+    # ===============================
+    with stage("preprocess.read_csv") as record:
+        df = pd.read_csv(RAW_DATA_PATH)
+        record.rows = len(df)
+        record.bytes_read = path_size(RAW_DATA_PATH)
+
+    # Rename first column to date if needed
+    if df.columns[0] != "date":
+        df.rename(columns={df.columns[0]: "date"}, inplace=True)
+
+    # Convert date column
+    with stage("preprocess.to_datetime") as record:
+        df["date"] = pd.to_datetime(df["date"], dayfirst=True)
+        record.rows = len(df)
+
+    print(f"Found {len(df.columns) - 1} states.")
 
-    # Drop missing values
-    state_df.dropna(inplace=True)
+    # ===============================
+    # CLEAN ALL STATES IN ONE PASS
+    # ===============================
+    with stage("preprocess.clean") as record:
+        long_df = clean_long(df, fill=args.fill, freq=args.freq)
+        record.rows = len(long_df)
 
-    # Sort by date
-    state_df = state_df.sort_values("date")
+    # ===============================
+    # SAVE PER-STATE TABLES
+    # ===============================
+    with stage("preprocess.write", storage=storage.name) as record:
+        storage.write_all("processed", long_df)
+        record.rows = len(long_df)
+        record.bytes_written = sum(
+            path_size(storage.location("processed", state))
+            for state in long_df["state"].unique()
+        )
 
-    # Save per-state file
-    output_path = os.path.join(OUTPUT_DIR, f"{state}_data.csv")
-    state_df.to_csv(output_path, index=False)
+    print(f"Saved {long_df['state'].nunique()} states ({len(long_df)} rows) to {storage.name} storage.")
+    print("✅ Preprocessing completed for all states.")
 
-    print(f"Saved: {output_path}")
 
-print("✅ Preprocessing completed for all states.")
+if __name__ == "__main__":
+    run(main, "preprocess_all_states")
@@ -0,0 +1,51 @@
+# ===============================
+# STATE NAME NORMALIZATION
+# ===============================
+# Abbreviations used as column names in the raw dataset, mapped to the
+# full names used for processed data, features and models.
+STATE_NAME_MAPPING = {
+    "UP": "Uttar Pradesh",
+    "MP": "Madhya Pradesh",
+    "HP": "Himachal Pradesh",
+    "J&K": "Jammu and Kashmir",
+    "DNH": "Dadra and Nagar Haveli",
+    "Pondy": "Puducherry",
+    "WB": "West Bengal",
+    "TN": "Tamil Nadu",
+    "TS": "Telangana",
+    "UK": "Uttarakhand",
+}
+
+
+def normalize_state_name(name):
+    return STATE_NAME_MAPPING.get(name, name)
+
+
+# ===============================
+# GRID REGIONS
+# ===============================
+# Regional grids the states report to, used for regional totals.
+REGIONS = {
+    "Northern": [
+        "Chandigarh", "Delhi", "Haryana", "Himachal Pradesh", "Jammu and Kashmir",
+        "Punjab", "Rajasthan", "Uttar Pradesh", "Uttarakhand",
+    ],
+    "Western": [
+        "Chhattisgarh", "Dadra and Nagar Haveli", "Goa", "Gujarat",
+        "Madhya Pradesh", "Maharashtra",
+    ],
+    "Southern": [
+        "Andhra Pradesh", "Karnataka", "Kerala", "Puducherry", "Tamil Nadu", "Telangana",
+    ],
+    "Eastern": ["Bihar", "Jharkhand", "Odisha", "Sikkim", "West Bengal"],
+    "North-Eastern": [
+        "Arunachal Pradesh", "Assam", "Manipur", "Meghalaya", "Mizoram",
+        "Nagaland", "Tripura",
+    ],
+}
+
+STATE_REGIONS = {state: region for region, members in REGIONS.items() for state in members}
+
+
+def region_of(state):
+    return STATE_REGIONS.get(normalize_state_name(state), "Other")
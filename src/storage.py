@@ -0,0 +1,286 @@
+import argparse
+import io
+import json
+import os
+import shutil
+from urllib.parse import quote, unquote
+
+import numpy as np
+import pandas as pd
+
+# ===============================
+# STAGES
+# ===============================
+# Each pipeline stage holds one table per state with a "date" column.
+# CSV keeps the historical one-file-per-state layout; Parquet stores the
+# same tables as a single state-partitioned dataset per stage.
+CSV_STAGES = {
+    "processed": ("data/processed", "_data.csv"),
+    "features": ("data/processed_features", "_features.csv"),
+}
+PARQUET_ROOT = "data/parquet"
+
+# Small integer columns stored as int8 in columnar form
+CALENDAR_COLUMNS = ["day", "month", "weekday", "hour", "minute"]
+
+
+def downcast(df):
+    """float64 -> float32 and calendar columns -> int8, dates untouched."""
+    df = df.copy()
+    for column in df.columns:
+        if column in CALENDAR_COLUMNS:
+            df[column] = df[column].astype(np.int8)
+        elif pd.api.types.is_float_dtype(df[column]):
+            df[column] = df[column].astype(np.float32)
+    return df
+
+
+# ===============================
+# CSV BACKEND
+# ===============================
+class CSVStorage:
+    name = "csv"
+
+    def _path(self, stage, state):
+        directory, suffix = CSV_STAGES[stage]
+        return os.path.join(directory, f"{state}{suffix}")
+
+    def location(self, stage, state):
+        return self._path(stage, state)
+
+    def list_states(self, stage):
+        directory, suffix = CSV_STAGES[stage]
+        if not os.path.isdir(directory):
+            return []
+        return sorted(
+            f[:-len(suffix)] for f in os.listdir(directory) if f.endswith(suffix)
+        )
+
+    def exists(self, stage, state):
+        return os.path.exists(self._path(stage, state))
+
+    def manifest_path(self, stage):
+        return os.path.join(CSV_STAGES[stage][0], "_manifest.json")
+
+    def read_state(self, stage, state, since=None):
+        path = self._path(stage, state)
+        if since is None:
+            source = path
+        else:
+            source = io.BytesIO(_csv_tail(path, pd.Timestamp(since)))
+        df = pd.read_csv(source, parse_dates=["date"], date_format="ISO8601")
+        if since is not None:
+            df = df[df["date"] >= since].reset_index(drop=True)
+        return df
+
+    def write_state(self, stage, state, df):
+        path = self._path(stage, state)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        df.to_csv(path, index=False)
+        return path
+
+    def append_state(self, stage, state, df):
+        path = self._path(stage, state)
+        df.to_csv(path, mode="a", header=False, index=False)
+        return path
+
+    def read_all(self, stage):
+        frames = []
+        for state in self.list_states(stage):
+            df = self.read_state(stage, state)
+            df.insert(0, "state", state)
+            frames.append(df)
+        return pd.concat(frames, ignore_index=True)
+
+    def write_all(self, stage, df):
+        for state, state_df in df.groupby("state", sort=True):
+            self.write_state(stage, state, state_df.drop(columns="state"))
+
+
+def _csv_tail(path, since, block=1 << 16):
+    """Header plus every line dated at or after ``since`` (and a few before).
+
+    Rows are in date order, as every writer keeps them, so this seeks back
+    from the end of the file in doubling blocks until a line dated before
+    ``since`` is found. Reads for recent dates cost in proportion to the
+    rows returned, not to the file's length.
+    """
+    with open(path, "rb") as f:
+        header = f.readline()
+        date_index = header.rstrip(b"\r\n").split(b",").index(b"date")
+        body_start = f.tell()
+        end = f.seek(0, os.SEEK_END)
+
+        start = body_start
+        position = end
+        while position > body_start:
+            position = max(body_start, position - block)
+            f.seek(position)
+            if position > body_start:
+                # Partial line; the next one starts a row
+                f.readline()
+            line_start = f.tell()
+            line = f.readline()
+            if line.strip() and pd.Timestamp(line.split(b",")[date_index].decode()) < since:
+                start = line_start
+                break
+            block *= 2
+
+        f.seek(start)
+        return header + f.read()
+
+
+# ===============================
+# PARQUET BACKEND
+# ===============================
+class ParquetStorage:
+    name = "parquet"
+
+    def __init__(self, root=PARQUET_ROOT):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError as exc:
+            raise ImportError(
+                "Parquet storage requires pyarrow: pip install pyarrow"
+            ) from exc
+        self.root = root
+
+    def _stage_dir(self, stage):
+        if stage not in CSV_STAGES:
+            raise KeyError(stage)
+        return os.path.join(self.root, stage)
+
+    def _partition(self, stage, state):
+        # Hive-style partition, so the whole stage reads back as one dataset
+        return os.path.join(self._stage_dir(stage), f"state={quote(state, safe='')}")
+
+    def location(self, stage, state):
+        return self._partition(stage, state)
+
+    def list_states(self, stage):
+        directory = self._stage_dir(stage)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(
+            unquote(d[len("state="):])
+            for d in os.listdir(directory)
+            if d.startswith("state=")
+        )
+
+    def exists(self, stage, state):
+        return os.path.isdir(self._partition(stage, state))
+
+    def manifest_path(self, stage):
+        # Leading underscore: ignored by pyarrow when reading the dataset
+        return os.path.join(self._stage_dir(stage), "_manifest.json")
+
+    def read_state(self, stage, state, since=None):
+        # Row-group statistics let pyarrow skip data before ``since``
+        filters = None if since is None else [("date", ">=", pd.Timestamp(since))]
+        df = pd.read_parquet(self._partition(stage, state), filters=filters)
+        return df.sort_values("date", kind="stable").reset_index(drop=True)
+
+    def write_state(self, stage, state, df):
+        partition = self._partition(stage, state)
+        shutil.rmtree(partition, ignore_errors=True)
+        os.makedirs(partition)
+        path = os.path.join(partition, "part-00000.parquet")
+        downcast(df).to_parquet(path, index=False)
+        return path
+
+    def append_state(self, stage, state, df):
+        # New rows go to a new file in the partition; existing parts stay put
+        partition = self._partition(stage, state)
+        part = len([f for f in os.listdir(partition) if f.endswith(".parquet")])
+        path = os.path.join(partition, f"part-{part:05d}.parquet")
+        downcast(df).to_parquet(path, index=False)
+        return path
+
+    def read_all(self, stage):
+        df = pd.read_parquet(self._stage_dir(stage))
+        df["state"] = df["state"].astype(str)
+        return df.sort_values(["state", "date"], kind="stable").reset_index(drop=True)
+
+    def write_all(self, stage, df):
+        for state, state_df in df.groupby("state", sort=True):
+            self.write_state(stage, state, state_df.drop(columns="state"))
+
+
+# ===============================
+# MANIFESTS
+# ===============================
+# Small per-stage JSON documents (e.g. last processed date per state)
+# stored next to the stage data.
+def read_manifest(storage, stage):
+    path = storage.manifest_path(stage)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_manifest(storage, stage, manifest):
+    path = storage.manifest_path(stage)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+
+# ===============================
+# BACKEND SELECTION
+# ===============================
+BACKENDS = {"csv": CSVStorage, "parquet": ParquetStorage}
+
+
+def get_storage(name=None):
+    """Return a storage backend by name.
+
+    ``None`` falls back to the LOAD_STORAGE environment variable, then to
+    "auto": Parquet when a Parquet dataset is present, otherwise CSV.
+    """
+    name = name or os.environ.get("LOAD_STORAGE", "auto")
+    if name == "auto":
+        name = "parquet" if os.path.isdir(PARQUET_ROOT) else "csv"
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown storage backend '{name}'. Choose from {sorted(BACKENDS)}.")
+    return BACKENDS[name]()
+
+
+def add_storage_argument(parser):
+    parser.add_argument(
+        "--storage",
+        choices=["auto"] + sorted(BACKENDS),
+        default=None,
+        help="Storage backend (default: $LOAD_STORAGE or auto-detect)."
+    )
+
+
+# ===============================
+# CONVERSION / EXPORT
+# ===============================
+def main():
+    parser = argparse.ArgumentParser(
+        description="Copy pipeline data between storage backends."
+    )
+    parser.add_argument("source", choices=sorted(BACKENDS))
+    parser.add_argument("target", choices=sorted(BACKENDS))
+    parser.add_argument(
+        "--stage",
+        choices=sorted(CSV_STAGES),
+        action="append",
+        help="Stage to copy (repeatable, default: all stages)."
+    )
+    args = parser.parse_args()
+
+    source = get_storage(args.source)
+    target = get_storage(args.target)
+
+    for stage in args.stage or sorted(CSV_STAGES):
+        states = source.list_states(stage)
+        for state in states:
+            target.write_state(stage, state, source.read_state(stage, state))
+        print(f"✅ Copied {len(states)} {stage} tables: {source.name} -> {target.name}")
+
+
+if __name__ == "__main__":
+    main()
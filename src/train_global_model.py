@@ -0,0 +1,234 @@
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import mean_squared_error
+
+from feature_state import ALL_CALENDAR_FEATURES
+from forecasting import recursive_forecast
+from instrumentation import path_size, run, stage
+from model_store import (
+    GLOBAL_MODEL,
+    MODEL_DIR,
+    forest_dir,
+    global_inputs,
+    load_global,
+    load_model,
+    pickle_path,
+    save_model,
+    write_metadata,
+)
+from storage import add_storage_argument, get_storage
+from train_models_all_states import build_model
+
+# ===============================
+# PATHS
+# ===============================
+REPORT_PATH = "results/global_vs_state.csv"
+ACCURACY_PATH = "results/global_vs_state_rmse.csv"
+
+# Forecast length timed for the predict latency comparison
+LATENCY_STEPS = 30
+
+
+# ===============================
+# MODEL DEFINITION
+# ===============================
+def build_global_model(n_jobs=-1):
+    # Slightly larger leaves keep one forest over every state's rows
+    # smaller than the per-state forests together
+    return RandomForestRegressor(
+        n_estimators=100,
+        min_samples_leaf=3,
+        random_state=42,
+        n_jobs=n_jobs
+    )
+
+
+# ===============================
+# DATA
+# ===============================
+def load_splits(storage):
+    """Per-state time-based train/test splits, made as train_state makes them."""
+    splits = {}
+    for state in storage.list_states("features"):
+        df = storage.read_state("features", state)
+        split_index = int(len(df) * 0.8)
+        splits[state] = {
+            "X": df.drop(columns=["date", "load"]),
+            "y": df["load"],
+            "history": df[["date", "load"]],
+            "split": split_index,
+        }
+    return splits
+
+
+# ===============================
+# TRAIN GLOBAL MODEL
+# ===============================
+def train_global(splits, n_jobs=-1, model_dir=MODEL_DIR):
+    """Fit one forest on every state's training rows and save it.
+
+    Each state's load features and target are divided by its mean training
+    load, so states of very different size share one scale, and the
+    state's code is added as a feature.
+    """
+    feature_names = list(next(iter(splits.values()))["X"].columns)
+    if any(list(split["X"].columns) != feature_names for split in splits.values()):
+        raise ValueError("All states need the same feature columns for a global model")
+
+    load_columns = [
+        i for i, name in enumerate(feature_names) if name not in ALL_CALENDAR_FEATURES
+    ]
+
+    states = {}
+    inputs, targets = [], []
+    for code, (state, split) in enumerate(sorted(splits.items())):
+        y_train = split["y"].iloc[:split["split"]]
+        scale = float(y_train.mean())
+        states[state] = {"code": code, "scale": scale}
+
+        inputs.append(global_inputs(split["X"].iloc[:split["split"]], load_columns, code, scale))
+        targets.append(y_train.to_numpy() / scale)
+
+    X = pd.DataFrame(np.vstack(inputs), columns=feature_names + ["state_code"])
+    y = np.concatenate(targets)
+
+    model = build_global_model(n_jobs)
+    with stage("global.fit", states=len(states), n_jobs=n_jobs) as record:
+        model.fit(X, y)
+        record.rows = len(X)
+
+    with stage("global.save") as record:
+        path = save_model(model, GLOBAL_MODEL, model_dir)
+        write_metadata(GLOBAL_MODEL, {
+            "engine": "random_forest",
+            "feature_names": feature_names,
+            "load_columns": load_columns,
+            "states": states,
+        }, model_dir)
+        record.bytes_written = path_size(path) + path_size(forest_dir(GLOBAL_MODEL, model_dir))
+
+    return model
+
+
+def test_rmse(model, split):
+    start = split["split"]
+    y_pred = model.predict(split["X"].iloc[start:])
+    return np.sqrt(mean_squared_error(split["y"].iloc[start:], y_pred))
+
+
+# ===============================
+# COMPARISON WITH PER-STATE MODELS
+# ===============================
+def serving_costs(splits, load):
+    """Seconds to load every state's model, and mean ms per forecast."""
+    start = time.perf_counter()
+    models = {state: load(state) for state in splits}
+    load_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for state, split in splits.items():
+        recursive_forecast(models[state], split["history"], LATENCY_STEPS)
+    predict_ms = (time.perf_counter() - start) * 1000 / len(splits)
+
+    return models, load_seconds, predict_ms
+
+
+def compare_per_state(splits, n_jobs=-1):
+    # Trained into a scratch directory so the served models are untouched
+    with tempfile.TemporaryDirectory() as model_dir:
+        start = time.perf_counter()
+        for state, split in splits.items():
+            model = build_model(n_jobs)
+            model.fit(split["X"].iloc[:split["split"]], split["y"].iloc[:split["split"]])
+            save_model(model, state, model_dir)
+        train_seconds = time.perf_counter() - start
+
+        size = sum(
+            path_size(pickle_path(state, model_dir)) + path_size(forest_dir(state, model_dir))
+            for state in splits
+        )
+        models, load_seconds, predict_ms = serving_costs(
+            splits, lambda state: load_model(state, model_dir)
+        )
+        rmse = {state: test_rmse(models[state], split) for state, split in splits.items()}
+
+    return {
+        "Model": "per-state",
+        "Artifacts": len(splits),
+        "MeanRMSE": np.mean(list(rmse.values())),
+        "TrainSeconds": train_seconds,
+        "ArtifactMB": size / 1024 ** 2,
+        "LoadSeconds": load_seconds,
+        "PredictMs": predict_ms,
+    }, rmse
+
+
+# ===============================
+# MAIN
+# ===============================
+def main():
+    parser = argparse.ArgumentParser(
+        description="Train one global model across all states."
+    )
+    parser.add_argument(
+        "--compare",
+        action="store_true",
+        help="Also train per-state models (in a scratch directory) and write a comparison report."
+    )
+    add_storage_argument(parser)
+    args = parser.parse_args()
+
+    storage = get_storage(args.storage)
+    splits = load_splits(storage)
+
+    start = time.perf_counter()
+    train_global(splits)
+    train_seconds = time.perf_counter() - start
+
+    _, load_seconds, predict_ms = serving_costs(splits, load_global)
+    global_rmse = {
+        state: test_rmse(load_global(state), split) for state, split in splits.items()
+    }
+    print(f"✅ Global model trained on {len(splits)} states | "
+          f"mean RMSE: {np.mean(list(global_rmse.values())):.2f}")
+
+    if not args.compare:
+        return
+
+    # ===============================
+    # COMPARISON REPORT
+    # ===============================
+    per_state, state_rmse = compare_per_state(splits)
+    report = pd.DataFrame([per_state, {
+        "Model": "global",
+        "Artifacts": 1,
+        "MeanRMSE": np.mean(list(global_rmse.values())),
+        "TrainSeconds": train_seconds,
+        "ArtifactMB": (
+            path_size(pickle_path(GLOBAL_MODEL)) + path_size(forest_dir(GLOBAL_MODEL))
+        ) / 1024 ** 2,
+        "LoadSeconds": load_seconds,
+        "PredictMs": predict_ms,
+    }])
+    accuracy = pd.DataFrame({
+        "State": list(splits),
+        "StateRMSE": [state_rmse[state] for state in splits],
+        "GlobalRMSE": [global_rmse[state] for state in splits],
+    })
+
+    os.makedirs("results", exist_ok=True)
+    report.to_csv(REPORT_PATH, index=False)
+    accuracy.to_csv(ACCURACY_PATH, index=False)
+
+    print(report.round(3).to_string(index=False))
+    print(f"📊 Comparison saved to {REPORT_PATH} (per state: {ACCURACY_PATH})")
+
+
+if __name__ == "__main__":
+    run(main, "train_global_model")
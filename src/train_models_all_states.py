@@ -1,33 +1,95 @@
 import pandas as pd
 import os
-import joblib
-from sklearn.ensemble import RandomForestRegressor
+import argparse
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from sklearn.metrics import mean_squared_error
 import numpy as np
+import time
+
+from estimators import (
+    DEFAULT_ENGINE,
+    ENGINES,
+    PRESETS_PATH,
+    build_estimator,
+    fit_estimator,
+    has_preset,
+    load_presets,
+    n_trees,
+    resolve_preset,
+)
+from forecasting import make_predictor
+from instrumentation import path_size, run, stage
+from model_store import (
+    MODEL_DIR,
+    archive_model,
+    export_compiled,
+    forest_dir,
+    load_estimator,
+    load_model,
+    pickle_path,
+    read_metadata,
+    save_model,
+    write_metadata,
+)
+from storage import add_storage_argument, get_storage
 
 # ===============================
 # PATHS
 # ===============================
-FEATURE_DIR = "data/processed_features"
-MODEL_DIR = "models"
 RESULTS_PATH = "results/model_performance.csv"
+UPDATES_PATH = "results/model_updates.csv"
+EXPORT_PATH = "results/model_export.csv"
 
-os.makedirs(MODEL_DIR, exist_ok=True)
-os.makedirs("results", exist_ok=True)
+# Fewer new rows than this are too noisy to judge drift on
+MIN_DRIFT_ROWS = 7
 
-results = []
 
 # ===============================
-# TRAIN MODEL FOR EACH STATE
+# MODEL DEFINITION
 # ===============================
-for file in os.listdir(FEATURE_DIR):
-    if not file.endswith("_features.csv"):
-        continue
+def build_model(n_jobs=-1, engine=DEFAULT_ENGINE, params=None):
+    return build_estimator(engine, n_jobs, params)
+
+
+def fit_model(engine, params, X_train, y_train, n_jobs=-1, validation_fraction=0.1):
+    model = build_model(n_jobs, engine, params)
+
+    # Engines with early stopping hold out the latest training rows, so
+    # validation never sees data older than what the model trains on
+    fit_index = len(X_train)
+    if ENGINES[engine]["early_stopping"] and validation_fraction > 0:
+        fit_index = int(len(X_train) * (1 - validation_fraction))
+
+    has_val = fit_index < len(X_train)
+    return fit_estimator(
+        engine,
+        model,
+        X_train.iloc[:fit_index],
+        y_train.iloc[:fit_index],
+        X_train.iloc[fit_index:] if has_val else None,
+        y_train.iloc[fit_index:] if has_val else None,
+    )
 
-    state_name = file.replace("_features.csv", "")
-    file_path = os.path.join(FEATURE_DIR, file)
 
-    df = pd.read_csv(file_path)
+# ===============================
+# TRAIN MODEL FOR ONE STATE
+# ===============================
+def train_state(
+    state_name,
+    storage,
+    n_jobs=-1,
+    engine=None,
+    presets=None,
+    validation_fraction=0.1,
+    params=None,
+):
+    # With ``params``, ``engine`` and ``params`` are used as given instead
+    # of being resolved from the presets
+    with stage("train.read", state=state_name, storage=storage.name) as record:
+        df = storage.read_state("features", state_name)
+        record.rows = len(df)
+        record.bytes_read = path_size(storage.location("features", state_name))
 
     # -------------------------------
     # Features and target
@@ -45,37 +107,397 @@ for file in os.listdir(FEATURE_DIR):
     # -------------------------------
     # Train model
     # -------------------------------
-    model = RandomForestRegressor(
-        n_estimators=200,
-        random_state=42,
-        n_jobs=-1
-    )
-    model.fit(X_train, y_train)
+    if params is None:
+        engine, params = resolve_preset(state_name, presets or {}, engine)
+    with stage("train.fit", state=state_name, engine=engine, n_jobs=n_jobs) as record:
+        model = fit_model(engine, params, X_train, y_train, n_jobs, validation_fraction)
+        record.rows = len(X_train)
 
     # -------------------------------
     # Evaluate
     # -------------------------------
-    y_pred = model.predict(X_test)
+    with stage("train.evaluate", state=state_name) as record:
+        y_pred = model.predict(X_test)
+        record.rows = len(X_test)
     rmse = np.sqrt(mean_squared_error(y_test, y_pred))
 
     # -------------------------------
     # Save model
     # -------------------------------
-    model_path = os.path.join(MODEL_DIR, f"{state_name}_model.pkl")
-    joblib.dump(model, model_path)
+    # Updates treat rows after data_through as new, and schedule the next
+    # full retrain from it
+    data_through = df["date"].iloc[-1]
+    previous = read_metadata(state_name) or {}
+    save_version(model, state_name, {
+        "version": previous.get("version", 0) + 1,
+        "engine": engine,
+        "params": params,
+        "data_through": data_through,
+        "full_retrain_through": data_through,
+        "rmse": rmse,
+        "n_estimators": n_trees(model),
+        "updates": 0,
+    }, check=X_test)
 
-    results.append({
+    return {
         "State": state_name,
+        "Engine": engine,
         "RMSE": rmse
-    })
+    }
+
 
-    print(f"✅ Trained model for {state_name} | RMSE: {rmse:.2f}")
+def save_version(model, state_name, metadata, check=None):
+    # Pickle plus a compiled memory-mappable copy used for serving (checked
+    # against the pickle on ``check`` rows), the metadata updates need, and
+    # a version of all three hard-linked to them
+    with stage("train.save", state=state_name, version=metadata["version"]) as record:
+        path = save_model(model, state_name, check=check)
+        write_metadata(state_name, metadata)
+        archive_model(state_name, metadata["version"])
+        record.bytes_written = path_size(path) + path_size(forest_dir(state_name))
 
+
+# ===============================
+# COMPILED EXPORT FOR ONE STATE
 # ===============================
-# SAVE PERFORMANCE SUMMARY
+def single_row_ms(predict, row, repeats=200):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        predict(row)
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def export_state(state_name, storage, repeats=200):
+    """Recompile a state's saved model without retraining.
+
+    Checks the compiled predictions against the pickle on the held-out
+    rows and times the single-row calls recursive forecasting makes.
+    Models trained before their engine could be compiled, or under an
+    older scikit-learn, gain a compiled copy this way.
+    """
+    with stage("export.read", state=state_name, storage=storage.name) as record:
+        df = storage.read_state("features", state_name)
+        record.rows = len(df)
+    X_test = df.drop(columns=["date", "load"]).iloc[int(len(df) * 0.8):]
+
+    model = load_estimator(state_name)
+    with stage("export.compile", state=state_name) as record:
+        exported = export_compiled(model, state_name, check=X_test)
+        record.rows = len(X_test)
+        record.bytes_written = path_size(forest_dir(state_name))
+
+    kind, max_error = exported or (None, None)
+    row = X_test.to_numpy(dtype=np.float32)[-1:]
+    return {
+        "State": state_name,
+        "Compiled": kind,
+        "MaxError": max_error,
+        "PickleMs": single_row_ms(make_predictor(model), row, repeats),
+        "ServedMs": single_row_ms(make_predictor(load_model(state_name)), row, repeats),
+    }
+
+
 # ===============================
-results_df = pd.DataFrame(results)
-results_df.to_csv(RESULTS_PATH, index=False)
+# INCREMENTAL UPDATE FOR ONE STATE
+# ===============================
+def update_state(
+    state_name,
+    storage,
+    n_jobs=-1,
+    new_trees=20,
+    window=365,
+    max_trees=400,
+    drift=0.25,
+    full_every=90,
+    engine=None,
+    presets=None,
+):
+    """Grow a state's forest with trees fit on recent data.
+
+    Rows dated after the last run are new. The saved forest keeps its trees
+    and gains ``new_trees`` fit on the last ``window`` rows. A full retrain
+    happens instead when there is no saved model or its engine cannot be
+    grown, when the model's error on the new rows exceeds its original test
+    RMSE by more than ``drift``, when ``full_every`` days of data have
+    passed since the last full retrain, or when the forest would exceed
+    ``max_trees``.
+    """
+    metadata = read_metadata(state_name)
+
+    # Without --engine or a preset, full retrains keep the engine and
+    # parameters the state was last trained with
+    params = None
+    if metadata is not None and engine is None and not has_preset(state_name, presets or {}):
+        engine = metadata.get("engine", DEFAULT_ENGINE)
+        params = metadata.get("params")
+
+    if metadata is None or not os.path.exists(pickle_path(state_name)):
+        return _full_retrain(state_name, storage, n_jobs, "no model", engine, presets, params=params)
+
+    with stage("update.read", state=state_name, storage=storage.name) as record:
+        df = storage.read_state("features", state_name)
+        record.rows = len(df)
+
+    X = df.drop(columns=["date", "load"])
+    y = df["load"]
+
+    new = (df["date"] > pd.Timestamp(metadata["data_through"])).to_numpy()
+    if not new.any():
+        return {
+            "State": state_name,
+            "Mode": "unchanged",
+            "NewRows": 0,
+            "RecentRMSE": None,
+            "Trees": metadata["n_estimators"],
+            "Version": metadata["version"],
+        }
+
+    # -------------------------------
+    # Drift and schedule checks
+    # -------------------------------
+    with stage("update.load", state=state_name):
+        model = load_estimator(state_name)
+
+    recent_rmse = np.sqrt(mean_squared_error(y[new], model.predict(X[new])))
+    since_full = df["date"].iloc[-1] - pd.Timestamp(metadata["full_retrain_through"])
+
+    reason = None
+    if not ENGINES[metadata.get("engine", DEFAULT_ENGINE)]["warm_start"]:
+        reason = "engine"
+    elif new.sum() >= MIN_DRIFT_ROWS and recent_rmse > metadata["rmse"] * (1 + drift):
+        reason = "drift"
+    elif since_full.days >= full_every:
+        reason = "schedule"
+    elif model.n_estimators + new_trees > max_trees:
+        reason = "size"
+
+    if reason:
+        return _full_retrain(
+            state_name, storage, n_jobs, reason, engine, presets, int(new.sum()), recent_rmse,
+            params,
+        )
+
+    # -------------------------------
+    # Warm start: keep old trees, add new ones on the recent window
+    # -------------------------------
+    model.set_params(
+        warm_start=True,
+        n_estimators=model.n_estimators + new_trees,
+        n_jobs=n_jobs
+    )
+    with stage("update.fit", state=state_name, new_trees=new_trees) as record:
+        model.fit(X.iloc[-window:], y.iloc[-window:])
+        record.rows = min(window, len(X))
+    model.set_params(warm_start=False)
+
+    metadata.update(
+        version=metadata["version"] + 1,
+        data_through=df["date"].iloc[-1],
+        n_estimators=model.n_estimators,
+        updates=metadata["updates"] + 1,
+    )
+    save_version(model, state_name, metadata, check=X.iloc[-window:])
+
+    return {
+        "State": state_name,
+        "Mode": "warm start",
+        "NewRows": int(new.sum()),
+        "RecentRMSE": recent_rmse,
+        "Trees": model.n_estimators,
+        "Version": metadata["version"],
+    }
+
+
+def _full_retrain(
+    state_name,
+    storage,
+    n_jobs,
+    reason,
+    engine=None,
+    presets=None,
+    new_rows=None,
+    recent_rmse=None,
+    params=None,
+):
+    train_state(state_name, storage, n_jobs, engine, presets, params=params)
+    metadata = read_metadata(state_name)
+    return {
+        "State": state_name,
+        "Mode": f"full ({reason})",
+        "NewRows": new_rows,
+        "RecentRMSE": recent_rmse,
+        "Trees": metadata["n_estimators"],
+        "Version": metadata["version"],
+    }
+
+
+# ===============================
+# CORE ALLOCATION
+# ===============================
+def split_cores(workers, n_states):
+    # State-level processes first (they also parallelize I/O and dumps),
+    # remaining cores go to tree building inside each fit.
+    cpus = os.cpu_count() or 1
+    if workers <= 0:
+        workers = cpus
+    workers = max(1, min(workers, n_states, cpus))
+    tree_jobs = max(1, cpus // workers)
+    return workers, tree_jobs
+
+
+# ===============================
+# TRAIN ALL STATES
+# ===============================
+def main():
+    parser = argparse.ArgumentParser(
+        description="Train one model per state."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="States trained in parallel processes (0 = one per CPU core)."
+    )
+    parser.add_argument(
+        "--engine",
+        choices=list(ENGINES),
+        help=f"Estimator for states without a preset (default: {DEFAULT_ENGINE})."
+    )
+    parser.add_argument(
+        "--presets",
+        default=PRESETS_PATH,
+        help="JSON file of per-state engines and hyperparameters (default: %(default)s)."
+    )
+    parser.add_argument(
+        "--validation-fraction",
+        type=float,
+        default=0.1,
+        help="Latest share of training rows held out for early stopping."
+    )
+    parser.add_argument(
+        "--update",
+        action="store_true",
+        help="Add trees fit on recent data to the saved models instead of retraining."
+    )
+    parser.add_argument("--new-trees", type=int, default=20, help="Trees added per update.")
+    parser.add_argument(
+        "--window",
+        type=int,
+        default=365,
+        help="Most recent rows the new trees are fit on."
+    )
+    parser.add_argument(
+        "--max-trees",
+        type=int,
+        default=400,
+        help="Retrain fully once an updated forest would exceed this size."
+    )
+    parser.add_argument(
+        "--drift",
+        type=float,
+        default=0.25,
+        help="Retrain fully when RMSE on new rows exceeds the test RMSE by this fraction."
+    )
+    parser.add_argument(
+        "--full-every",
+        type=int,
+        default=90,
+        help="Retrain fully after this many days of data since the last full retrain."
+    )
+    parser.add_argument(
+        "--export-only",
+        action="store_true",
+        help="Recompile the saved models for serving and check them, without training."
+    )
+    add_storage_argument(parser)
+    args = parser.parse_args()
+
+    storage = get_storage(args.storage)
+
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    os.makedirs("results", exist_ok=True)
+
+    states = storage.list_states("features")
+    presets = load_presets(args.presets)
+
+    if args.export_only:
+        task = export_state
+        output_path = EXPORT_PATH
+    elif args.update:
+        task = partial(
+            update_state,
+            new_trees=args.new_trees,
+            window=args.window,
+            max_trees=args.max_trees,
+            drift=args.drift,
+            full_every=args.full_every,
+            engine=args.engine,
+            presets=presets,
+        )
+        output_path = UPDATES_PATH
+    else:
+        task = partial(
+            train_state,
+            engine=args.engine,
+            presets=presets,
+            validation_fraction=args.validation_fraction,
+        )
+        output_path = RESULTS_PATH
+
+    results = []
+
+    # Exports take milliseconds per state, less than starting a pool
+    if args.workers == 1 or args.export_only:
+        for state_name in states:
+            result = task(state_name, storage)
+            results.append(result)
+            report(result)
+    else:
+        workers, tree_jobs = split_cores(args.workers, len(states))
+        print(f"Training {len(states)} states on {workers} workers x {tree_jobs} tree jobs.")
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(task, state_name, storage, tree_jobs)
+                for state_name in states
+            ]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                report(result)
+
+    # ===============================
+    # SAVE PERFORMANCE SUMMARY
+    # ===============================
+    # Sorted so the summary is identical whatever order workers finish in
+    results_df = pd.DataFrame(results).sort_values("State").reset_index(drop=True)
+    results_df.to_csv(output_path, index=False)
+
+    if args.export_only:
+        print("🎯 Compiled models exported for all states.")
+    else:
+        print("🎯 Training completed for all states.")
+    print(f"📊 Summary saved to {output_path}")
+
+
+def report(result):
+    if "Compiled" in result:
+        served = result["Compiled"] or "pickle"
+        print(
+            f"✅ {result['State']}: serving {served} | single row "
+            f"{result['PickleMs']:.3f} ms -> {result['ServedMs']:.3f} ms"
+        )
+    elif "Mode" in result:
+        print(
+            f"✅ {result['State']}: {result['Mode']} | "
+            f"{result['Trees']} trees | version {result['Version']}"
+        )
+    else:
+        print(
+            f"✅ Trained {result['Engine']} model for {result['State']} | "
+            f"RMSE: {result['RMSE']:.2f}"
+        )
+
 
-print("🎯 Training completed for all states.")
-print(f"📊 Performance summary saved to {RESULTS_PATH}")
+if __name__ == "__main__":
+    run(main, "train_models_all_states")
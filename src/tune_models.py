@@ -0,0 +1,339 @@
+import argparse
+import hashlib
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import mean_squared_error
+from sklearn.model_selection import TimeSeriesSplit
+
+from estimators import ENGINES, PRESETS_PATH, load_presets
+from instrumentation import run, stage
+from storage import add_storage_argument, get_storage
+from train_models_all_states import fit_model, split_cores
+
+# ===============================
+# PATHS
+# ===============================
+CACHE_DIR = ".cache/tuning"
+RESULTS_PATH = "results/tuning.csv"
+
+# ===============================
+# SEARCH SPACES
+# ===============================
+SEARCH_SPACES = {
+    "random_forest": {
+        "n_estimators": [100, 200, 400],
+        "max_depth": [None, 10, 20],
+        "min_samples_leaf": [1, 2, 5],
+        "max_features": [1.0, 0.5, "sqrt"],
+    },
+    "hist_gradient_boosting": {
+        "learning_rate": [0.03, 0.05, 0.1],
+        "max_leaf_nodes": [15, 31, 63],
+        "min_samples_leaf": [10, 20, 40],
+        "l2_regularization": [0.0, 0.1, 1.0],
+    },
+    "lightgbm": {
+        "learning_rate": [0.03, 0.05, 0.1],
+        "num_leaves": [15, 31, 63],
+        "min_child_samples": [10, 20, 40],
+        "reg_lambda": [0.0, 0.1, 1.0],
+    },
+    "xgboost": {
+        "learning_rate": [0.03, 0.05, 0.1],
+        "max_depth": [3, 6, 9],
+        "min_child_weight": [1, 5, 10],
+        "reg_lambda": [0.0, 1.0, 5.0],
+    },
+}
+
+
+def candidates(engines, n_iter, seed):
+    """Up to ``n_iter`` distinct (engine, params) pairs, sampled from the grids."""
+    grid = []
+    for engine in engines:
+        space = SEARCH_SPACES[engine]
+        for values in itertools.product(*space.values()):
+            grid.append((engine, dict(ENGINES[engine]["defaults"], **dict(zip(space, values)))))
+
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(grid), size=min(n_iter, len(grid)), replace=False)
+    return [grid[i] for i in sorted(picks)]
+
+
+# ===============================
+# FOLD MATRIX CACHE
+# ===============================
+def cache_state_matrices(storage, state, cache_dir):
+    """Write a state's training-period matrices to the cache once.
+
+    Only the rows train_state trains on are used, so its held-out test
+    rows stay unseen. Returns the content hash keying the cached files and
+    every trial run on them.
+    """
+    df = storage.read_state("features", state)
+    df = df.iloc[:int(len(df) * 0.8)]
+    X = df.drop(columns=["date", "load"])
+    y = df["load"].to_numpy(dtype=np.float64)
+
+    values = X.to_numpy(dtype=np.float64)
+    digest = hashlib.sha1()
+    digest.update(json.dumps(list(X.columns)).encode("utf-8"))
+    digest.update(values.tobytes())
+    digest.update(y.tobytes())
+    data_key = digest.hexdigest()[:16]
+
+    directory = os.path.join(cache_dir, "folds", data_key)
+    if not os.path.isdir(directory):
+        temp_dir = f"{directory}.{os.getpid()}.tmp"
+        os.makedirs(temp_dir, exist_ok=True)
+        np.save(os.path.join(temp_dir, "X.npy"), values)
+        np.save(os.path.join(temp_dir, "y.npy"), y)
+        with open(os.path.join(temp_dir, "columns.json"), "w") as f:
+            json.dump(list(X.columns), f)
+        os.replace(temp_dir, directory)
+
+    return data_key
+
+
+def load_matrices(cache_dir, data_key):
+    directory = os.path.join(cache_dir, "folds", data_key)
+    with open(os.path.join(directory, "columns.json")) as f:
+        columns = json.load(f)
+    X = np.load(os.path.join(directory, "X.npy"), mmap_mode="r")
+    y = np.load(os.path.join(directory, "y.npy"), mmap_mode="r")
+    return pd.DataFrame(X, columns=columns), pd.Series(y)
+
+
+# ===============================
+# TRIALS
+# ===============================
+def trial_key(data_key, engine, params, fold, n_folds):
+    payload = json.dumps([data_key, engine, params, fold, n_folds], sort_keys=True)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def run_trial(cache_dir, data_key, engine, params, fold, n_folds, n_jobs=1):
+    """Validation RMSE of one candidate on one time-series fold."""
+    X, y = load_matrices(cache_dir, data_key)
+    train_index, val_index = list(TimeSeriesSplit(n_splits=n_folds).split(X))[fold]
+
+    model = fit_model(engine, params, X.iloc[train_index], y.iloc[train_index], n_jobs)
+    y_pred = model.predict(X.iloc[val_index])
+    return float(np.sqrt(mean_squared_error(y.iloc[val_index], y_pred)))
+
+
+class TrialLog:
+    """Completed trials, appended to a JSON-lines file as they finish.
+
+    Only the parent process writes, so an interrupted search loses at most
+    the trials still running, and a repeated one reruns none.
+    """
+
+    def __init__(self, cache_dir):
+        self.path = os.path.join(cache_dir, "trials.jsonl")
+        self.scores = {}
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Torn last line from an interrupted run
+                        continue
+                    self.scores[entry["key"]] = entry["rmse"]
+
+    def __contains__(self, key):
+        return key in self.scores
+
+    def add(self, key, rmse):
+        self.scores[key] = rmse
+        with open(self.path, "a") as f:
+            f.write(json.dumps({"key": key, "rmse": rmse}) + "\n")
+
+
+# ===============================
+# SEARCH
+# ===============================
+def evaluate(jobs, log, cache_dir, n_folds, workers):
+    """Run every (data_key, engine, params, fold) job not yet in the log."""
+    pending = {}
+    for data_key, engine, params, fold in jobs:
+        key = trial_key(data_key, engine, params, fold, n_folds)
+        if key not in log and key not in pending:
+            pending[key] = (data_key, engine, params, fold)
+
+    if not pending:
+        return
+
+    workers, tree_jobs = split_cores(workers, len(pending))
+    print(f"Running {len(pending)} trials on {workers} workers "
+          f"({len(jobs) - len(pending)} cached).")
+
+    if workers == 1:
+        for key, (data_key, engine, params, fold) in pending.items():
+            log.add(key, run_trial(cache_dir, data_key, engine, params, fold, n_folds, -1))
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(run_trial, cache_dir, *job, n_folds, tree_jobs): key
+            for key, job in pending.items()
+        }
+        for future in as_completed(futures):
+            log.add(futures[future], future.result())
+
+
+def mean_rmse(log, data_key, engine, params, folds, n_folds):
+    return float(np.mean([
+        log.scores[trial_key(data_key, engine, params, fold, n_folds)] for fold in folds
+    ]))
+
+
+def search(data_keys, pool, log, cache_dir, n_folds, workers, method="random", eta=3):
+    """Mean CV RMSE of each state's surviving candidates.
+
+    ``random`` scores every candidate on every fold. ``halving`` scores
+    all candidates on the latest fold only, keeps the best 1/``eta`` per
+    state, and adds earlier folds each round until one round uses all of
+    them. Every state runs its rounds in the same process pool.
+    """
+    # Latest folds first: they are closest to the data being forecast
+    fold_order = list(range(n_folds))[::-1]
+
+    if method == "random":
+        rounds = [n_folds]
+    else:
+        rounds = []
+        n_candidates, n_used = len(pool), 1
+        while n_candidates > 1 and n_used < n_folds:
+            rounds.append(n_used)
+            n_candidates = max(1, n_candidates // eta)
+            n_used = min(n_folds, n_used * eta)
+        rounds.append(n_folds)
+
+    survivors = {state: list(pool) for state in data_keys}
+    for round_index, n_used in enumerate(rounds):
+        folds = fold_order[:n_used]
+        with stage("tune.round", round=round_index, folds=n_used) as record:
+            jobs = [
+                (data_keys[state], engine, params, fold)
+                for state, pool_ in survivors.items()
+                for engine, params in pool_
+                for fold in folds
+            ]
+            evaluate(jobs, log, cache_dir, n_folds, workers)
+            record.rows = len(jobs)
+
+        scores = {
+            state: sorted(
+                ((mean_rmse(log, data_keys[state], engine, params, folds, n_folds), engine, params)
+                 for engine, params in pool_),
+                key=lambda entry: entry[0],
+            )
+            for state, pool_ in survivors.items()
+        }
+        if round_index < len(rounds) - 1:
+            keep = max(1, len(pool) // eta ** (round_index + 1))
+            survivors = {
+                state: [(engine, params) for _, engine, params in ranked[:keep]]
+                for state, ranked in scores.items()
+            }
+
+    return scores
+
+
+# ===============================
+# PRESETS OUTPUT
+# ===============================
+def write_presets(best, path=PRESETS_PATH):
+    # Other states' presets and the default entry are kept
+    presets = load_presets(path)
+    states = presets.setdefault("states", {})
+    for state, (rmse, engine, params) in best.items():
+        states[state] = {"engine": engine, "params": params, "cv_rmse": rmse}
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(presets, f, indent=2, sort_keys=True)
+
+
+# ===============================
+# TUNE ALL STATES
+# ===============================
+def main():
+    parser = argparse.ArgumentParser(
+        description="Tune per-state hyperparameters with time-series cross-validation."
+    )
+    parser.add_argument(
+        "--engines",
+        nargs="+",
+        choices=list(SEARCH_SPACES),
+        default=["random_forest"],
+        help="Engines whose search spaces are sampled (default: %(default)s)."
+    )
+    parser.add_argument("--search", choices=["random", "halving"], default="halving")
+    parser.add_argument("--n-iter", type=int, default=27, help="Candidates sampled.")
+    parser.add_argument("--eta", type=int, default=3, help="Halving keeps 1/eta per round.")
+    parser.add_argument("--folds", type=int, default=5, help="Time-series CV folds.")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--states", nargs="+", help="Only tune these states.")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Parallel trial processes (0 = one per CPU core, 1 = no pool)."
+    )
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument(
+        "--presets",
+        default=PRESETS_PATH,
+        help="Per-state config the best parameters are written to (default: %(default)s)."
+    )
+    add_storage_argument(parser)
+    args = parser.parse_args()
+
+    storage = get_storage(args.storage)
+    states = args.states or storage.list_states("features")
+    os.makedirs(args.cache_dir, exist_ok=True)
+
+    with stage("tune.cache_folds", states=len(states)):
+        data_keys = {
+            state: cache_state_matrices(storage, state, args.cache_dir) for state in states
+        }
+
+    pool = candidates(args.engines, args.n_iter, args.seed)
+    log = TrialLog(args.cache_dir)
+    print(f"Tuning {len(states)} states over {len(pool)} candidates "
+          f"({args.search}, {args.folds} folds).")
+
+    scores = search(
+        data_keys, pool, log, args.cache_dir, args.folds, args.workers, args.search, args.eta
+    )
+
+    # ===============================
+    # SAVE RESULTS
+    # ===============================
+    best = {state: ranked[0] for state, ranked in scores.items()}
+    write_presets(best, args.presets)
+
+    results_df = pd.DataFrame([
+        {"State": state, "Rank": rank + 1, "Engine": engine,
+         "Params": json.dumps(params, sort_keys=True), "CV_RMSE": rmse}
+        for state, ranked in sorted(scores.items())
+        for rank, (rmse, engine, params) in enumerate(ranked)
+    ])
+    os.makedirs("results", exist_ok=True)
+    results_df.to_csv(RESULTS_PATH, index=False)
+
+    for state, (rmse, engine, params) in sorted(best.items()):
+        print(f"✅ {state}: {engine} | CV RMSE {rmse:.2f}")
+    print(f"📊 Best configs written to {args.presets} (all scores: {RESULTS_PATH})")
+
+
+if __name__ == "__main__":
+    run(main, "tune_models")
@@ -0,0 +1,58 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# The pipeline modules import each other by bare name, as when run from src/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from feature_state import add_lag_features, feature_columns  # noqa: E402
+
+
+# ===============================
+# SYNTHETIC FIXTURES
+# ===============================
+@pytest.fixture(scope="session")
+def series():
+    """About a year of daily load with yearly and weekly seasonality."""
+    rng = np.random.default_rng(0)
+    dates = pd.date_range("2020-01-01", periods=400, freq="D")
+    t = np.arange(len(dates))
+    load = (
+        100
+        + 10 * np.sin(2 * np.pi * t / 365.25)
+        - 5 * (dates.weekday >= 5)
+        + rng.normal(0, 2, len(t))
+    )
+    return pd.DataFrame({"date": dates, "load": np.round(load, 1)})
+
+
+@pytest.fixture(scope="session")
+def training_data(series):
+    df = add_lag_features(series.copy()).dropna()
+    return df[feature_columns()], df["load"]
+
+
+@pytest.fixture(scope="session")
+def forest(training_data):
+    from sklearn.ensemble import RandomForestRegressor
+
+    X, y = training_data
+    return RandomForestRegressor(n_estimators=10, max_depth=8, random_state=0).fit(X, y)
+
+
+@pytest.fixture(scope="session")
+def booster(training_data):
+    from sklearn.ensemble import HistGradientBoostingRegressor
+
+    X, y = training_data
+    return HistGradientBoostingRegressor(max_iter=30, random_state=0).fit(X, y)
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Scratch directory for code that reads and writes relative paths."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
@@ -0,0 +1,16 @@
+from estimators import build_estimator, fit_estimator, n_trees
+
+
+def test_n_trees_counts_boosting_iterations(training_data):
+    X, y = training_data
+    split = int(len(X) * 0.8)
+    model = build_estimator(
+        "hist_gradient_boosting", params={"max_iter": 500, "n_iter_no_change": 5, "random_state": 0}
+    )
+    fit_estimator("hist_gradient_boosting", model, X[:split], y[:split], X[split:], y[split:])
+
+    assert n_trees(model) == model.n_iter_ < 500
+
+
+def test_n_trees_counts_forest_trees(forest):
+    assert n_trees(forest) == 10
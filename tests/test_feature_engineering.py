@@ -0,0 +1,26 @@
+import numpy as np
+import pandas as pd
+
+from feature_engineering_all_states import create_features, create_features_long
+
+
+def test_long_pass_matches_each_state_alone(series):
+    # Different lengths, so a shift leaking across states would show up
+    parts = {"Assam": series.iloc[:60], "Goa": series.iloc[60:150], "Kerala": series.iloc[150:170]}
+    long_df = pd.concat(
+        [part.assign(state=state) for state, part in parts.items()], ignore_index=True
+    )
+
+    features = create_features_long(long_df)
+
+    assert sorted(features["state"].unique()) == sorted(parts)
+    for state, part in parts.items():
+        alone = create_features(part).reset_index(drop=True)
+        together = features[features["state"] == state].drop(columns="state").reset_index(drop=True)
+        assert list(together.columns) == list(alone.columns)
+        np.testing.assert_array_equal(together["date"], alone["date"])
+        np.testing.assert_allclose(
+            together.drop(columns="date").to_numpy(dtype=float),
+            alone.drop(columns="date").to_numpy(dtype=float),
+            rtol=1e-12,
+        )
@@ -0,0 +1,46 @@
+import numpy as np
+
+from feature_state import BatchFeatureState, FeatureState, add_lag_features
+
+LAGS = (1, 7, 14)
+WINDOWS = (3, 7)
+
+
+def expected_values(df):
+    columns = [f"lag_{k}" for k in LAGS] + [f"rolling_mean_{w}" for w in WINDOWS]
+    return df[columns].to_numpy()
+
+
+def test_feature_state_matches_add_lag_features(series):
+    loads = series["load"].to_numpy()
+    expected = expected_values(add_lag_features(series.copy(), LAGS, WINDOWS))
+
+    state = FeatureState.from_history(loads[:14], LAGS, WINDOWS)
+    for i in range(14, len(loads)):
+        np.testing.assert_allclose(state.values(), expected[i], rtol=1e-12)
+        state.push(loads[i])
+
+
+def test_from_history_matches_pushing_every_load(series):
+    loads = series["load"].to_numpy()
+    pushed = FeatureState(LAGS, WINDOWS)
+    for load in loads:
+        pushed.push(load)
+
+    np.testing.assert_allclose(
+        FeatureState.from_history(loads, LAGS, WINDOWS).values(), pushed.values(), rtol=1e-12
+    )
+
+
+def test_batch_feature_state_matches_single_paths(series):
+    loads = series["load"].to_numpy()
+    steps = np.random.default_rng(0).normal(100, 10, size=(20, 3))
+
+    batch = BatchFeatureState.from_history(loads, 3, LAGS, WINDOWS)
+    singles = [FeatureState.from_history(loads, LAGS, WINDOWS) for _ in range(3)]
+    for row in steps:
+        batch.push(row)
+        for single, load in zip(singles, row):
+            single.push(load)
+
+    np.testing.assert_allclose(batch.values(), [single.values() for single in singles], rtol=1e-12)
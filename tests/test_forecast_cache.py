@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from forecast_cache import ForecastCache, forecast_key
+from forecasting import forecast_intervals, recursive_forecast
+from model_store import FlatBoosting, FlatForest, ModelCache, save_model
+
+
+@pytest.fixture
+def key(series):
+    return forecast_key("Goa", series["date"].iloc[-1], "model")
+
+
+@pytest.mark.parametrize("disk", [False, True])
+def test_extended_cache_entry_matches_direct_forecast(tmp_path, forest, series, key, disk):
+    cache = ForecastCache(disk_dir=str(tmp_path) if disk else None)
+
+    short = cache.forecast(key, forest, series, 5)
+    if disk:
+        # A second worker continues from the trajectory on disk
+        cache = ForecastCache(disk_dir=str(tmp_path))
+    extended = cache.forecast(key, forest, series, 20)
+    direct = recursive_forecast(forest, series, 20)
+
+    pd.testing.assert_frame_equal(extended, direct)
+    pd.testing.assert_frame_equal(short, direct.iloc[:5])
+    pd.testing.assert_frame_equal(cache.forecast(key, forest, series, 12), direct.iloc[:12])
+    assert cache.hits == 1
+
+
+def test_model_cache_reloads_a_replaced_model(tmp_path, forest, booster):
+    save_model(forest, "Goa", tmp_path)
+    models = ModelCache(model_dir=str(tmp_path))
+    first, fingerprint = models.get("Goa")
+
+    save_model(booster, "Goa", tmp_path)
+    second, new_fingerprint = models.get("Goa")
+
+    assert new_fingerprint != fingerprint
+    assert isinstance(first, FlatForest) and isinstance(second, FlatBoosting)
+
+
+def test_cached_intervals_are_prefixes_of_longer_runs(forest, series, key):
+    cache = ForecastCache()
+
+    longer = cache.intervals(key, forest, series, 15, paths=50, seed=1)
+    shorter = cache.intervals(key, forest, series, 6, paths=50, seed=1)
+
+    pd.testing.assert_frame_equal(shorter, longer.iloc[:6].reset_index(drop=True))
+    pd.testing.assert_frame_equal(longer, forecast_intervals(forest, series, 15, paths=50, seed=1))
+    # The app and service read the point forecast from the interval frame
+    np.testing.assert_allclose(
+        longer["prediction"], recursive_forecast(forest, series, 15)["prediction"], rtol=1e-12
+    )
@@ -0,0 +1,43 @@
+import pandas as pd
+import pytest
+
+from forecast_service import ForecastError, Forecaster
+from model_store import save_model
+from storage import CSVStorage
+
+
+@pytest.fixture
+def forecaster(workdir, series, forest):
+    storage = CSVStorage()
+    storage.write_state("features", "Goa", series)
+    save_model(forest, "Goa", "models")
+    return Forecaster(storage, model_dir="models")
+
+
+def test_timezone_aware_date_is_rejected(forecaster):
+    with pytest.raises(ForecastError) as error:
+        forecaster.steps_ahead("Goa", "2021-02-06T05:00+05:00")
+    assert error.value.status == 400
+
+
+def test_batch_reports_bad_dates_per_item(forecaster, series):
+    last_date = series["date"].iloc[-1]
+    results = forecaster.forecast_batch([
+        {"state": "Goa", "date": "2021-02-06T05:00+05:00"},
+        {"state": "Goa", "date": "not a date"},
+        {"state": "Goa", "date": (last_date + pd.Timedelta(days=3)).strftime("%Y-%m-%d")},
+    ])
+
+    assert "timezone" in results[0]["error"]
+    assert "Invalid date" in results[1]["error"]
+    assert results[2]["steps"] == 3
+
+
+def test_intervals_need_per_tree_predictions(workdir, series, forecaster, booster):
+    save_model(booster, "Bihar", "models")
+    CSVStorage().write_state("features", "Bihar", series)
+
+    with pytest.raises(ForecastError) as error:
+        forecaster.trajectory("Bihar", 5, intervals=True)
+    assert error.value.status == 422
+    assert "q5" in forecaster.trajectory("Goa", 5, intervals=True)
@@ -0,0 +1,27 @@
+import numpy as np
+import pandas as pd
+
+from feature_state import feature_columns
+from forecasting import make_predictor, recursive_forecast
+
+
+def test_make_predictor_matches_predict(forest, training_data):
+    X, _ = training_data
+    predict = make_predictor(forest)
+
+    np.testing.assert_allclose(predict(X.to_numpy(dtype=np.float32)), forest.predict(X), rtol=1e-12)
+
+
+def test_first_step_uses_the_latest_history(forest, series):
+    loads = series["load"].to_numpy()
+    date = series["date"].iloc[-1] + pd.Timedelta(days=1)
+    row = pd.DataFrame(
+        [[loads[-1], loads[-7], loads[-7:].mean(), date.day, date.month, date.weekday()]],
+        columns=feature_columns(),
+    )
+
+    forecast = recursive_forecast(forest, series, 10)
+
+    assert forecast["date"].iloc[0] == date
+    assert len(forecast) == 10
+    np.testing.assert_allclose(forecast["prediction"].iloc[0], forest.predict(row)[0], rtol=1e-12)
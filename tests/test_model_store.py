@@ -0,0 +1,121 @@
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import LinearRegression
+
+from forecasting import recursive_forecast
+from model_store import (
+    FlatBoosting,
+    FlatForest,
+    archive_model,
+    compile_model,
+    export_compiled,
+    forest_dir,
+    load_compiled,
+    pickle_path,
+    save_model,
+    versions_dir,
+)
+
+
+# ===============================
+# COMPILED PREDICTIONS
+# ===============================
+@pytest.mark.parametrize("name, kind", [("forest", FlatForest), ("booster", FlatBoosting)])
+def test_compiled_model_matches_sklearn(request, training_data, name, kind):
+    model = request.getfixturevalue(name)
+    X, _ = training_data
+
+    compiled = compile_model(model)
+
+    assert isinstance(compiled, kind)
+    np.testing.assert_allclose(compiled.predict(X.to_numpy()), model.predict(X), rtol=1e-9, atol=1e-6)
+
+
+def test_flat_forest_predict_each_matches_trees(forest, training_data):
+    X, _ = training_data
+    values = X.to_numpy(dtype=np.float32)
+    trees = np.random.default_rng(0).integers(0, len(forest.estimators_), len(values))
+
+    compiled = compile_model(forest)
+    expected = [forest.estimators_[tree].predict(row[None])[0] for tree, row in zip(trees, values)]
+
+    np.testing.assert_allclose(compiled.predict_each(values, trees), expected, rtol=1e-9, atol=1e-6)
+
+
+@pytest.mark.parametrize("name", ["forest", "booster"])
+def test_compiled_forecast_matches_estimator(request, series, name):
+    model = request.getfixturevalue(name)
+
+    expected = recursive_forecast(model, series, 30)
+    actual = recursive_forecast(compile_model(model), series, 30)
+
+    pd.testing.assert_series_equal(actual["date"], expected["date"])
+    np.testing.assert_allclose(actual["prediction"], expected["prediction"], rtol=1e-9, atol=1e-6)
+
+
+@pytest.mark.parametrize("name", ["forest", "booster"])
+def test_compiled_model_round_trips_memory_mapped(request, tmp_path, training_data, name):
+    model = request.getfixturevalue(name)
+    X, _ = training_data
+    compiled = compile_model(model)
+
+    compiled.save(tmp_path / "compiled")
+    loaded = load_compiled(tmp_path / "compiled", mmap=True)
+
+    assert type(loaded) is type(compiled)
+    np.testing.assert_array_equal(loaded.predict(X.to_numpy()), compiled.predict(X.to_numpy()))
+
+
+def test_compile_model_rejects_other_estimators(training_data):
+    X, y = training_data
+    with pytest.raises(TypeError):
+        compile_model(LinearRegression().fit(X, y))
+
+
+# ===============================
+# SAVING AND VERSIONS
+# ===============================
+@pytest.mark.parametrize("name, kind", [("forest", "forest"), ("booster", "boosting")])
+def test_export_compiled_checks_predictions(request, tmp_path, training_data, name, kind):
+    X, _ = training_data
+
+    result = export_compiled(request.getfixturevalue(name), "A", tmp_path, check=X)
+
+    assert result[0] == kind and result[1] <= 1e-6
+    assert load_compiled(forest_dir("A", tmp_path)).kind == kind
+
+
+def test_save_model_skips_compiled_copy_that_differs(tmp_path, forest, training_data, monkeypatch):
+    X, _ = training_data
+    monkeypatch.setattr(FlatForest, "predict", lambda self, X: np.zeros(len(X)))
+
+    save_model(forest, "A", tmp_path, check=X)
+
+    assert os.path.exists(pickle_path("A", tmp_path))
+    assert not os.path.exists(forest_dir("A", tmp_path))
+
+
+def test_archived_version_survives_later_saves(tmp_path, forest, booster, training_data):
+    X, _ = training_data
+    save_model(forest, "A", tmp_path, check=X)
+    first = archive_model("A", 1, tmp_path)
+
+    save_model(booster, "A", tmp_path, check=X)
+    archive_model("A", 2, tmp_path)
+
+    archived = joblib.load(pickle_path("A", first))
+    np.testing.assert_array_equal(archived.predict(X), forest.predict(X))
+    assert isinstance(load_compiled(forest_dir("A", first)), FlatForest)
+    assert sorted(os.listdir(versions_dir("A", tmp_path))) == ["v0001", "v0002"]
+
+
+def test_archive_keeps_newest_versions(tmp_path, forest):
+    save_model(forest, "A", tmp_path)
+    for version in range(1, 5):
+        archive_model("A", version, tmp_path, keep=2)
+
+    assert sorted(os.listdir(versions_dir("A", tmp_path))) == ["v0003", "v0004"]
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from preprocess_all_states import RAW_DATE_FORMAT, clean_long, stream_clean
+from storage import CSVStorage
+
+
+@pytest.fixture
+def raw_path(workdir):
+    """Wide raw export with stray tokens, gaps and a repeated timestamp."""
+    rng = np.random.default_rng(0)
+    dates = pd.date_range("2021-01-01", periods=40, freq="D")
+    table = pd.DataFrame({"date": dates.strftime(RAW_DATE_FORMAT)})
+    for state in ("Assam", "Goa", "Orissa"):
+        table[state] = np.round(rng.uniform(10, 100, len(dates)), 1).astype(str)
+    table.loc[[0, 9, 10, 25], "Assam"] = "--"
+    table.loc[[3, 4], "Goa"] = ""
+    # Same timestamp on both sides of a chunk boundary; the first reading wins
+    table = pd.concat([table.iloc[:8], table.iloc[[7]].assign(Orissa="1.0"), table.iloc[8:]])
+
+    path = workdir / "raw.csv"
+    table.to_csv(path, index=False)
+    return path
+
+
+def whole_file(path, fill):
+    # Same steps as preprocess_all_states.main without --stream
+    df = pd.read_csv(path)
+    df["date"] = pd.to_datetime(df["date"], dayfirst=True)
+    return clean_long(df, fill=fill)
+
+
+@pytest.mark.parametrize("fill", ["drop", "ffill"])
+def test_stream_clean_matches_whole_file(raw_path, fill):
+    expected = whole_file(raw_path, fill)
+    storage = CSVStorage()
+
+    written = stream_clean(storage, str(raw_path), chunksize=8, fill=fill)
+
+    assert sorted(written) == sorted(expected["state"].unique())
+    for state, state_df in expected.groupby("state"):
+        actual = storage.read_state("processed", state)
+        assert written[state] == len(state_df)
+        np.testing.assert_array_equal(actual["date"], state_df["date"])
+        np.testing.assert_array_equal(actual["load"], state_df["load"])
+
+
+def test_stream_clean_rejects_unparsed_dates(workdir):
+    path = workdir / "raw.csv"
+    pd.DataFrame({"date": ["2021-01-01", "2021-01-02"], "Goa": [1.0, 2.0]}).to_csv(path, index=False)
+
+    with pytest.raises(ValueError, match="date format"):
+        stream_clean(CSVStorage(), str(path))
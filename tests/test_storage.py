@@ -0,0 +1,40 @@
+import io
+
+import pandas as pd
+import pytest
+
+from feature_engineering_all_states import create_features, update_features
+from storage import CSVStorage, _csv_tail
+
+
+@pytest.fixture
+def storage(workdir, series):
+    storage = CSVStorage()
+    storage.write_state("processed", "Goa", series)
+    return storage
+
+
+def test_csv_tail_matches_full_read(storage, series):
+    path = storage.location("processed", "Goa")
+    full = storage.read_state("processed", "Goa")
+
+    for since in [series["date"].iloc[0], series["date"].iloc[200], series["date"].iloc[-1],
+                  series["date"].iloc[-1] + pd.Timedelta(days=1)]:
+        tail = pd.read_csv(
+            io.BytesIO(_csv_tail(path, since, block=256)), parse_dates=["date"], date_format="ISO8601"
+        )
+        expected = full[full["date"] >= since].reset_index(drop=True)
+        pd.testing.assert_frame_equal(tail[tail["date"] >= since].reset_index(drop=True), expected)
+        pd.testing.assert_frame_equal(storage.read_state("processed", "Goa", since=since), expected)
+
+
+def test_update_features_matches_full_rebuild(storage):
+    full = create_features(storage.read_state("processed", "Goa"))
+    last_date = full["date"].iloc[-30]
+
+    new_rows = update_features(storage, "Goa", last_date)
+
+    pd.testing.assert_frame_equal(
+        new_rows.reset_index(drop=True),
+        full[full["date"] > last_date].reset_index(drop=True),
+    )